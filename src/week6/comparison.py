@@ -0,0 +1,180 @@
+import csv
+import json
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from items import Item
+from testing import Tester
+
+
+def shared(function):
+    """
+    Wrap a function of an Item, such as description, so that on a PreparedItem its result is worked out
+    once and then reused by every predictor that calls it; on any other Item the function is simply called
+    Predictors look up global functions when they're called, so in a notebook
+        description = shared(description)
+    is enough for the existing predictors that call description(item) to share its results
+    """
+    function = getattr(function, "shared", function)
+    @functools.wraps(function)
+    def input_for(item):
+        inputs = getattr(item, "_inputs", None)
+        if inputs is None:
+            return function(item)
+        if function not in inputs:
+            inputs[function] = function(item)
+        return inputs[function]
+    input_for.shared = function
+    return input_for
+
+
+class PreparedItem(Item):
+    """
+    A copy of an Item whose test prompt is worked out once, however many predictors ask for it,
+    along with the results of any shared functions of it (see shared)
+    """
+
+    __slots__ = ("_test_prompt", "_inputs")
+
+    @classmethod
+    def of(cls, item, inputs=None) -> "PreparedItem":
+        """
+        Prepare a copy of this item, working out the inputs up front: a list of functions of an Item,
+        or a dict of them, whose results are also stored as attributes by name
+        """
+        prepared = cls.restore(item.title, item.price, item.prompt, item.token_count, getattr(item, "category", None), item.details)
+        prepared._test_prompt = Item.test_prompt(prepared)
+        prepared._inputs = {}
+        functions = inputs.items() if isinstance(inputs, dict) else [(None, function) for function in inputs or []]
+        for name, function in functions:
+            result = shared(function)(prepared)
+            if name:
+                setattr(prepared, name, result)
+        return prepared
+
+    def test_prompt(self):
+        return self._test_prompt
+
+
+class Comparison:
+    """
+    Runs several predictors over the same first size datapoints, in one pass, and prints them side by side
+    The datapoints are prepared once for all the predictors (see PreparedItem): pass inputs, a list of
+    functions such as [description], to work out the inputs the predictors share up front too;
+    the predictors get those results when they call the function through shared (see shared)
+    The predictors run in parallel, each in a headless Tester that is given the rest of the options
+    Each metric comes with a bootstrap confidence interval, and the average error of each predictor
+    is compared with the first one's on the same resamples, to tell a real win from noise
+    """
+
+    def __init__(self, predictors, data, size=250, inputs=None, samples=1000, confidence=0.95, seed=42, report_file=None, **options):
+        if not isinstance(predictors, dict):
+            predictors = {getattr(predictor, "__name__", type(predictor).__name__).replace("_", " ").title(): predictor for predictor in predictors}
+        self.predictors = predictors
+        self.data = data
+        self.size = size
+        self.inputs = inputs
+        self.samples = samples
+        self.confidence = confidence
+        self.seed = seed
+        self.report_file = report_file
+        self.options = options
+        self.testers = {}
+
+    def prepare(self):
+        """
+        Return the datapoints, each prepared once for all the predictors, followed by those after them
+        that the Testers make their warmup calls on
+        """
+        count = min(self.size + self.options.get("warmup", 0), len(self.data))
+        return [PreparedItem.of(self.data[i], self.inputs) for i in range(count)]
+
+    def evaluate(self, tester, datapoints):
+        if tester.warmup:
+            tester.warm_up()
+        tester.evaluate(datapoints, tester.predict(datapoints))
+        return tester
+
+    def resamples(self) -> np.ndarray:
+        """
+        Return samples rows of datapoint indices, drawn with replacement, shared by every predictor
+        """
+        return np.random.default_rng(self.seed).integers(0, self.size, size=(self.samples, self.size))
+
+    def interval(self, values):
+        """
+        Return the bounds of the confidence interval for one metric across the resamples
+        """
+        tail = (1 - self.confidence) / 2 * 100
+        return np.percentile(values, [tail, 100 - tail]).tolist()
+
+    def results(self):
+        """
+        Return a dict of metrics, with their confidence intervals, for each predictor in turn
+        """
+        indices = self.resamples()
+        baseline = None
+        results = []
+        for name, tester in self.testers.items():
+            errors = tester.errors[indices].mean(axis=1)
+            rmsles = np.sqrt(tester.sles[indices].mean(axis=1))
+            hits = (tester.colors[indices] == "green").mean(axis=1)
+            baseline = errors if baseline is None else baseline
+            results.append({
+                "name": name,
+                **tester.metrics(),
+                "average_error_interval": self.interval(errors),
+                "rmsle_interval": self.interval(rmsles),
+                "hit_rate_interval": self.interval(hits),
+                "error_change_interval": self.interval(errors - baseline),
+                "timings": tester.timings(),
+            })
+        return results
+
+    def report(self, results):
+        """
+        Print a table with a row for each predictor
+        """
+        print(f"{'Predictor':<24} {'Error':>24} {'RMSLE':>20} {'Hits':>20} {'Error vs first':>24} {'p50':>8}")
+        for result in results:
+            low, high = result["average_error_interval"]
+            error = f"${result['average_error']:,.2f} [{low:,.2f}, {high:,.2f}]"
+            low, high = result["rmsle_interval"]
+            rmsle = f"{result['rmsle']:,.2f} [{low:,.2f}, {high:,.2f}]"
+            low, high = result["hit_rate_interval"]
+            hits = f"{result['hit_rate']*100:.1f}% [{low*100:.1f}, {high*100:.1f}]"
+            low, high = result["error_change_interval"]
+            change = f"[{low:+,.2f}, {high:+,.2f}]"
+            p50 = result["timings"]["p50"]
+            latency = f"{p50*1000:,.0f}ms" if p50 is not None else "-"
+            print(f"{result['name'][:24]:<24} {error:>24} {rmsle:>20} {hits:>20} {change:>24} {latency:>8}")
+
+    def save_report(self, filename, results):
+        """
+        Save the results to a .csv file with a row per predictor, or otherwise to a JSON file
+        """
+        with open(filename, "w", newline="") as file:
+            if filename.endswith(".csv"):
+                rows = [{key: json.dumps(value) if isinstance(value, (list, dict)) else value for key, value in result.items()} for result in results]
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump({"size": self.size, "samples": self.samples, "confidence": self.confidence, "predictors": results}, file, indent=2)
+
+    def run(self):
+        prepared = self.prepare()
+        datapoints = prepared[:self.size]
+        self.testers = {name: Tester(predictor, prepared, title=name, size=self.size, headless=True, progress_every=None, **self.options)
+                        for name, predictor in self.predictors.items()}
+        with ThreadPoolExecutor(max_workers=len(self.testers)) as pool:
+            list(pool.map(self.evaluate, self.testers.values(), [datapoints] * len(self.testers)))
+        results = self.results()
+        self.report(results)
+        if self.report_file:
+            self.save_report(self.report_file, results)
+        return results
+
+    @classmethod
+    def compare(cls, predictors, data, size=250, **options):
+        return cls(predictors, data, size=size, **options).run()
@@ -0,0 +1,64 @@
+"""
+Measure how many bytes each Item takes in memory, comparing the compact Item
+(with and without its details) against the plain __dict__ layout Items used to have
+
+Usage: python item_memory.py train.pkl
+"""
+
+import sys
+import pickle
+import tracemalloc
+from items import Item
+
+
+class DictItem:
+    """
+    The layout Items had before they used __slots__: every field in a per-instance __dict__
+    """
+
+    def __init__(self, title, price, prompt, token_count, category, details):
+        self.title = title
+        self.price = price
+        self.category = category
+        self.token_count = token_count
+        self.details = details
+        self.prompt = prompt
+        self.include = True
+
+
+def copy(text):
+    """
+    Return a private copy of this string, so each layout is charged for its own strings
+    """
+    return None if text is None else (text + ".")[:-1]
+
+
+def bytes_per_item(build, items) -> float:
+    """
+    Return the average memory allocated by build for each of these Items
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = [build(item) for item in items]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(built)
+
+
+def report(items):
+    """
+    Print the bytes per Item for each layout
+    """
+    layouts = {
+        "__dict__ Item with details": lambda item: DictItem(copy(item.title), item.price, copy(item.prompt), item.token_count, copy(item.category), copy(item.details)),
+        "__slots__ Item with details": lambda item: Item.restore(copy(item.title), item.price, copy(item.prompt), item.token_count, copy(item.category), copy(item.details)),
+        "__slots__ Item, details released": lambda item: Item.restore(copy(item.title), item.price, copy(item.prompt), item.token_count, copy(item.category)),
+    }
+    print(f"Measuring {len(items):,} Items")
+    for name, build in layouts.items():
+        print(f"{name:>36}: {bytes_per_item(build, items):,.0f} bytes per Item")
+
+
+if __name__=="__main__":
+    with open(sys.argv[1], 'rb') as file:
+        report(pickle.load(file))
@@ -1,6 +1,6 @@
-from typing import Optional
-from transformers import AutoTokenizer
+from typing import Optional, List
 import re
+import sys
 
 BASE_MODEL = "meta-llama/Meta-Llama-3.1-8B"
 MIN_TOKENS = 150
@@ -8,66 +8,230 @@ MAX_TOKENS = 160
 MIN_CHARS = 300
 CEILING_CHARS = MAX_TOKENS * 7
 
+class LazyTokenizer:
+    """
+    Loads the tokenizer the first time it's used, then caches it for the rest of this process
+    This keeps importing items and unpickling Items cheap
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.tokenizer = None
+
+    def load(self):
+        """
+        Return the tokenizer, loading it if this process hasn't done so yet
+        """
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+        return self.tokenizer
+
+    def __get__(self, instance, owner):
+        return self.load()
+
+class Scrubber:
+    """
+    Applies the Item cleaning rules to a whole list of strings per call
+    The strings are joined on a separator that none of the rules can match across,
+    so each rule makes one pass over the batch rather than one pass per string
+    """
+
+    SEPARATOR = "\x00"
+
+    def __init__(self, removals):
+        self.removals = removals
+        self.punctuation = re.compile(r'[:\[\]"{}【】\s]+')
+        self.product_numbers = re.compile(r' (?=[^ \x00]{7})[^ 0-9\x00]*[0-9][^ \x00]*')
+
+    def join(self, texts) -> Optional[str]:
+        """
+        Join these texts on the separator, or return None if any of them already contains it
+        """
+        joined = self.SEPARATOR.join(texts)
+        return joined if joined.count(self.SEPARATOR) == len(texts) - 1 else None
+
+    def remove(self, texts: List[str]) -> List[str]:
+        """
+        Remove each of the removals from every text, in order
+        """
+        joined = self.join(texts) if texts else None
+        if joined is None:
+            return [self.remove_one(text) for text in texts]
+        for remove in self.removals:
+            joined = joined.replace(remove, "")
+        return joined.split(self.SEPARATOR)
+
+    def remove_one(self, text: str) -> str:
+        for remove in self.removals:
+            text = text.replace(remove, "")
+        return text
+
+    def scrub(self, texts: List[str]) -> List[str]:
+        """
+        Clean up every text, removing unnecessary characters and whitespace
+        and words that are 7+ chars and contain numbers
+        ASCII texts are scrubbed together, as their only digits are 0-9; any others are scrubbed one at a time
+        """
+        results = [None if text.isascii() else self.scrub_one(text) for text in texts]
+        batch = [text for text in texts if text.isascii()]
+        joined = self.join(batch) if batch else None
+        if joined is None:
+            scrubbed = iter([self.scrub_one(text) for text in batch])
+        else:
+            joined = self.punctuation.sub(' ', joined).strip(' ')
+            joined = joined.replace(' ' + self.SEPARATOR, self.SEPARATOR).replace(self.SEPARATOR + ' ', self.SEPARATOR)
+            joined = joined.replace(" ,", ",").replace(",,,",",").replace(",,",",")
+            joined = self.product_numbers.sub('', self.SEPARATOR + ' ' + joined.replace(self.SEPARATOR, self.SEPARATOR + ' '))
+            scrubbed = iter(joined.replace(self.SEPARATOR + ' ', self.SEPARATOR)[1:].split(self.SEPARATOR))
+        return [next(scrubbed) if result is None else result for result in results]
+
+    def scrub_one(self, text: str) -> str:
+        text = self.punctuation.sub(' ', text).strip()
+        text = text.replace(" ,", ",").replace(",,,",",").replace(",,",",")
+        words = text.split(' ')
+        select = [word for word in words if len(word)<7 or not any(char.isdigit() for char in word)]
+        return " ".join(select)
+
 class Item:
     """
     An Item is a cleaned, curated datapoint of a Product with a Price
+    Fields live in __slots__ to keep hundreds of thousands of Items compact;
+    a __dict__ is only created if other attributes are set on an Item
     """
-    
-    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL, trust_remote_code=True)
+
+    __slots__ = ("title", "price", "_category", "token_count", "details", "prompt", "include", "__dict__")
+
+    tokenizer = LazyTokenizer(BASE_MODEL)
     PREFIX = "Price is $"
     QUESTION = "How much does this cost to the nearest dollar?"
     REMOVALS = ['"Batteries Included?": "No"', '"Batteries Included?": "Yes"', '"Batteries Required?": "No"', '"Batteries Required?": "Yes"', "By Manufacturer", "Item", "Date First", "Package", ":", "Number of", "Best Sellers", "Number", "Product "]
+    scrubber = Scrubber(REMOVALS)
 
     title: str
     price: float
-    category: str
-    token_count: int = 0
+    token_count: int
     details: Optional[str]
-    prompt: Optional[str] = None
-    include = False
+    prompt: Optional[str]
+    include: bool
 
-    def __init__(self, data, price):
+    @classmethod
+    def warm_up(cls):
+        """
+        Load the tokenizer now rather than on first use
+        Suitable as the initializer of a process pool, so each worker loads it exactly once
+        """
+        return cls.tokenizer
+
+    def __init__(self, data, price, parse=True, keep_details=True):
+        """
+        Create an Item from this datapoint, and parse it unless asked not to
+        The raw details are kept, as before; pass keep_details=False to release them once parsed
+        """
         self.title = data['title']
         self.price = price
-        self.parse(data)
+        self.token_count = 0
+        self.details = None
+        self.prompt = None
+        self.include = False
+        if parse:
+            self.parse(data, keep_details)
+
+    @property
+    def category(self) -> str:
+        return self._category
+
+    @category.setter
+    def category(self, category: str):
+        self._category = sys.intern(category)
+
+    def __setstate__(self, state):
+        """
+        Unpickle from either the slots of this class or the __dict__ of Items pickled before it had slots
+        """
+        dict_state, slot_state = state if isinstance(state, tuple) else (state, None)
+        self.token_count = 0
+        self.details = None
+        self.prompt = None
+        self.include = False
+        for name, value in {**(dict_state or {}), **(slot_state or {})}.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def restore(cls, title, price, prompt, token_count, category, details=None) -> "Item":
+        """
+        Recreate an included Item from its parsed fields, without parsing it again
+        A category of None leaves the Item without one, as Items made straight from a datapoint are
+        """
+        item = cls.__new__(cls)
+        item.title = title
+        item.price = price
+        item.prompt = prompt
+        item.token_count = token_count
+        if category is not None:
+            item.category = category
+        item.details = details
+        item.include = True
+        return item
 
     def scrub_details(self):
         """
         Clean up the details string by removing common text that doesn't add value
         """
-        details = self.details
-        for remove in self.REMOVALS:
-            details = details.replace(remove, "")
-        return details
+        return self.scrubber.remove([self.details])[0]
 
     def scrub(self, stuff):
         """
         Clean up the provided text by removing unnecessary characters and whitespace
         Also remove words that are 7+ chars and contain numbers, as these are likely irrelevant product numbers
         """
-        stuff = re.sub(r'[:\[\]"{}【】\s]+', ' ', stuff).strip()
-        stuff = stuff.replace(" ,", ",").replace(",,,",",").replace(",,",",")
-        words = stuff.split(' ')
-        select = [word for word in words if len(word)<7 or not any(char.isdigit() for char in word)]
-        return " ".join(select)
-    
-    def parse(self, data):
+        return self.scrubber.scrub([stuff])[0]
+
+    def prepare(self, data) -> Optional[str]:
+        """
+        Build the scrubbed text for this datapoint, ready to be tokenized
+        Return None if there isn't enough content to be worth tokenizing
+        """
+        return self.prepare_batch([self], [data])[0]
+
+    @classmethod
+    def prepare_batch(cls, items, datapoints) -> List[Optional[str]]:
+        """
+        Build the scrubbed text for each datapoint, scrubbing the whole batch in one go
+        None in place of any datapoint that doesn't have enough content to be worth tokenizing
+        """
+        for item, data in zip(items, datapoints):
+            item.details = data['details']
+        details = iter(cls.scrubber.remove([item.details for item in items if item.details]))
+        selected, titles, contents = [], [], []
+        for index, (item, data) in enumerate(zip(items, datapoints)):
+            text = '\n'.join(data['description'])
+            if text:
+                text += '\n'
+            features = '\n'.join(data['features'])
+            if features:
+                text += features + '\n'
+            if item.details:
+                text += next(details) + '\n'
+            if len(text) > MIN_CHARS:
+                selected.append(index)
+                titles.append(item.title)
+                contents.append(text[:CEILING_CHARS])
+        scrubbed = cls.scrubber.scrub(titles + contents)
+        texts = [None] * len(items)
+        for index, title, text in zip(selected, scrubbed, scrubbed[len(titles):]):
+            texts[index] = f"{title}\n{text}"
+        return texts
+
+    def parse(self, data, keep_details=True):
         """
         Parse this datapoint and if it fits within the allowed Token range,
         then set include to True
         """
-        contents = '\n'.join(data['description'])
-        if contents:
-            contents += '\n'
-        features = '\n'.join(data['features'])
-        if features:
-            contents += features + '\n'
-        self.details = data['details']
-        if self.details:
-            contents += self.scrub_details() + '\n'
-        if len(contents) > MIN_CHARS:
-            contents = contents[:CEILING_CHARS]
-            text = f"{self.scrub(self.title)}\n{self.scrub(contents)}"
+        text = self.prepare(data)
+        if not keep_details:
+            self.details = None
+        if text:
             tokens = self.tokenizer.encode(text, add_special_tokens=False)
             if len(tokens) > MIN_TOKENS:
                 tokens = tokens[:MAX_TOKENS]
@@ -75,12 +239,44 @@ class Item:
                 self.make_prompt(text)
                 self.include = True
 
+    @classmethod
+    def parse_batch(cls, datapoints, prices, keep_details=True) -> List["Item"]:
+        """
+        Create and parse an Item for each datapoint, equivalent to calling Item(datapoint, price)
+        on each one, but with a single batched tokenizer call per step instead of three per item
+        The returned Items have include set exactly as parse would have set it
+        """
+        items = [cls(datapoint, price, parse=False) for datapoint, price in zip(datapoints, prices)]
+        prepared = [(item, text) for item, text in zip(items, cls.prepare_batch(items, datapoints)) if text]
+        if not keep_details:
+            for item in items:
+                item.details = None
+        if not prepared:
+            return items
+        encoded = cls.tokenizer([text for _, text in prepared], add_special_tokens=False)['input_ids']
+        selected = [(item, tokens[:MAX_TOKENS]) for (item, _), tokens in zip(prepared, encoded) if len(tokens) > MIN_TOKENS]
+        if not selected:
+            return items
+        texts = cls.tokenizer.batch_decode([tokens for _, tokens in selected])
+        for (item, _), text in zip(selected, texts):
+            item.prompt = item.prompt_for(text)
+            item.include = True
+        prompts = cls.tokenizer([item.prompt for item, _ in selected], add_special_tokens=False)['input_ids']
+        for (item, _), tokens in zip(selected, prompts):
+            item.token_count = len(tokens)
+        return items
+
+    def prompt_for(self, text) -> str:
+        """
+        Return a prompt appropriate for training, built from the provided text
+        """
+        return f"{self.QUESTION}\n\n{text}\n\n{self.PREFIX}{str(round(self.price))}.00"
+
     def make_prompt(self, text):
         """
         Set the prompt instance variable to be a prompt appropriate for training
         """
-        self.prompt = f"{self.QUESTION}\n\n{text}\n\n"
-        self.prompt += f"{self.PREFIX}{str(round(self.price))}.00"
+        self.prompt = self.prompt_for(text)
         self.token_count = len(self.tokenizer.encode(self.prompt, add_special_tokens=False))
 
     def test_prompt(self):
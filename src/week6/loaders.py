@@ -1,68 +1,203 @@
 from datetime import datetime
+from collections import deque
+from itertools import islice
+from typing import List
 from tqdm import tqdm
-from datasets import load_dataset
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pyarrow as pa
+from datasets import Dataset, load_dataset, concatenate_datasets
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, as_completed
 from items import Item
+from store import SCHEMA, DETAILS_SCHEMA
+from parse_cache import open_cache
 
 CHUNK_SIZE = 1000
 MIN_PRICE = 0.5
 MAX_PRICE = 999.49
 
+# Datasets opened by this worker process, keyed by their arrow files
+open_datasets = {}
+
+def source_for(dataset):
+    """
+    Return something cheap to send to a worker process that lets it open this Dataset:
+    the arrow files behind it if it has them, otherwise the Dataset itself
+    """
+    files = tuple(file['filename'] for file in dataset.cache_files)
+    return files if files else dataset
+
+def open_dataset(source):
+    """
+    Open the Dataset for this source, memory-mapped from its arrow files and kept open for the life of the process
+    """
+    if not isinstance(source, tuple):
+        return source
+    if source not in open_datasets:
+        open_datasets[source] = concatenate_datasets([Dataset.from_file(file) for file in source])
+    return open_datasets[source]
+
+def parse_rows(loader, source, start, stop):
+    """
+    Run in a worker process: parse rows start to stop of the Dataset and return the Items as a RecordBatch
+    """
+    return loader.to_record_batch(loader.from_chunk(open_dataset(source).select(range(start, stop))))
+
+def parse_datapoints(loader, datapoints):
+    """
+    Run in a worker process: parse this list of datapoints and return the Items as a RecordBatch
+    """
+    return loader.to_record_batch(loader.from_chunk(datapoints))
+
 class ItemLoader:
 
 
-    def __init__(self, name):
+    def __init__(self, name, keep_details=True, cache=None):
+        """
+        Set up a loader for the named dataset
+        keep_details keeps the raw details string on each Item, as the notebooks expect; without it the Items are smaller
+        cache is the filename of a ParseCache, so that only new or changed datapoints are parsed
+        """
         self.name = name
+        self.keep_details = keep_details
+        self.cache = cache
         self.dataset = None
 
-    def from_datapoint(self, datapoint):
+    def __getstate__(self):
         """
-        Try to create an Item from this datapoint
-        Return the Item if successful, or None if it shouldn't be included
+        Leave the Dataset behind when this loader is sent to a worker process
+        """
+        return {**self.__dict__, "dataset": None}
+
+    def price_for(self, datapoint):
+        """
+        Return the price of this datapoint if it's within the allowed range, otherwise None
         """
         try:
             price_str = datapoint['price']
             if price_str:
                 price = float(price_str)
                 if MIN_PRICE <= price <= MAX_PRICE:
-                    item = Item(datapoint, price)
-                    return item if item.include else None
+                    return price
         except ValueError:
             return None
 
+    def from_datapoint(self, datapoint):
+        """
+        Try to create an Item from this datapoint
+        Return the Item if successful, or None if it shouldn't be included
+        """
+        price = self.price_for(datapoint)
+        if price is not None:
+            item = Item(datapoint, price, keep_details=self.keep_details)
+            return item if item.include else None
+
     def from_chunk(self, chunk):
         """
         Create a list of Items from this chunk of elements from the Dataset
+        The whole chunk is tokenized in batches rather than one datapoint at a time
         """
-        batch = []
+        datapoints, prices = [], []
         for datapoint in chunk:
-            result = self.from_datapoint(datapoint)
-            if result:
-                batch.append(result)
-        return batch
+            price = self.price_for(datapoint)
+            if price is not None:
+                datapoints.append(datapoint)
+                prices.append(price)
+        if self.cache:
+            items = open_cache(self.cache).parse_batch(datapoints, prices, self.keep_details)
+        else:
+            items = Item.parse_batch(datapoints, prices, self.keep_details)
+        return [item for item in items if item.include]
 
-    def chunk_generator(self):
+    def to_record_batch(self, items) -> pa.RecordBatch:
         """
-        Iterate over the Dataset, yielding chunks of datapoints at a time
+        Pack these Items into columns, which are far cheaper to send between processes than the Items themselves
+        """
+        columns = [
+            [item.title for item in items],
+            [item.price for item in items],
+            [item.prompt for item in items],
+            [item.token_count for item in items],
+            pa.DictionaryArray.from_arrays(pa.array([0] * len(items), pa.int32()), [self.name]),
+        ]
+        if self.keep_details:
+            columns.append([item.details for item in items])
+            return pa.RecordBatch.from_arrays(columns, schema=DETAILS_SCHEMA)
+        return pa.RecordBatch.from_arrays(columns, schema=SCHEMA)
+
+    def items_from(self, table) -> List[Item]:
+        """
+        Recreate Items from columns produced by to_record_batch
+        """
+        columns = [table.column(name).to_pylist() for name in table.schema.names]
+        return [Item.restore(*row) for row in zip(*columns)]
+
+    def chunk_ranges(self):
+        """
+        Iterate over the Dataset, yielding the start and stop of each chunk of datapoints
         """
         size = len(self.dataset)
         for i in range(0, size, CHUNK_SIZE):
-            yield self.dataset.select(range(i, min(i + CHUNK_SIZE, size)))
+            yield i, min(i + CHUNK_SIZE, size)
+
+    def chunk_stream(self, dataset):
+        """
+        Iterate over a streamed Dataset, yielding lists of datapoints at a time
+        """
+        iterator = iter(dataset)
+        while chunk := list(islice(iterator, CHUNK_SIZE)):
+            yield chunk
+
+    def iter_items(self, workers=8, window=None):
+        """
+        Stream this dataset rather than downloading it in full, yielding curated Items as they're made
+        At most window chunks (by default 2 per worker) are in flight at once,
+        so memory stays flat no matter how big the category is
+        """
+        window = window or workers * 2
+        dataset = load_dataset("McAuley-Lab/Amazon-Reviews-2023", f"raw_meta_{self.name}", split="full", streaming=True, trust_remote_code=True)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=Item.warm_up)
+        pending = deque()
+        try:
+            for chunk in tqdm(self.chunk_stream(dataset)):
+                pending.append(pool.submit(parse_datapoints, self, chunk))
+                if len(pending) >= window:
+                    yield from self.items_from(pending.popleft().result())
+            while pending:
+                yield from self.items_from(pending.popleft().result())
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def submit_chunks(self, pool) -> List[Future]:
+        """
+        Submit every chunk of the Dataset to this pool, returning a Future of a RecordBatch for each
+        """
+        source = source_for(self.dataset)
+        return [pool.submit(parse_rows, self, source, start, stop) for start, stop in self.chunk_ranges()]
+
+    def table_from(self, batches) -> pa.Table:
+        return pa.Table.from_batches(batches, schema=DETAILS_SCHEMA if self.keep_details else SCHEMA)
+
+    def load_table(self, workers) -> pa.Table:
+        """
+        Use concurrent.futures to farm out the work to process chunks of datapoints -
+        Workers open the Dataset themselves from its memory-mapped files, and send back columns rather than Items
+        """
+        with ProcessPoolExecutor(max_workers=workers, initializer=Item.warm_up) as pool:
+            batches = [future.result() for future in tqdm(self.submit_chunks(pool))]
+        return self.table_from(batches)
 
     def load_in_parallel(self, workers):
         """
         Use concurrent.futures to farm out the work to process chunks of datapoints -
         This speeds up processing significantly, but will tie up your computer while it's doing so!
         """
-        results = []
-        chunk_count = (len(self.dataset) // CHUNK_SIZE) + 1
-        with ProcessPoolExecutor(max_workers=workers) as pool:
-            for batch in tqdm(pool.map(self.from_chunk, self.chunk_generator()), total=chunk_count):
-                results.extend(batch)
-        for result in results:
-            result.category = self.name
-        return results
-            
+        return self.items_from(self.load_table(workers))
+
+    def download(self):
+        """
+        Download this dataset from the Hugging Face hub, or open it from the local cache
+        """
+        self.dataset = load_dataset("McAuley-Lab/Amazon-Reviews-2023", f"raw_meta_{self.name}", split="full", trust_remote_code=True)
+
     def load(self, workers=8):
         """
         Load in this dataset; the workers parameter specifies how many processes
@@ -70,12 +205,39 @@ class ItemLoader:
         """
         start = datetime.now()
         print(f"Loading dataset {self.name}", flush=True)
-        self.dataset = load_dataset("McAuley-Lab/Amazon-Reviews-2023", f"raw_meta_{self.name}", split="full", trust_remote_code=True)
+        self.download()
         results = self.load_in_parallel(workers)
         finish = datetime.now()
         print(f"Completed {self.name} with {len(results):,} datapoints in {(finish-start).total_seconds()/60:.1f} mins", flush=True)
         return results
-        
 
-    
-    
\ No newline at end of file
+    @classmethod
+    def load_all(cls, names, workers=8, downloads=2, keep_details=True, cache=None) -> List[Item]:
+        """
+        Load several datasets, sharing one long-lived pool of worker processes between them all
+        Datasets download in background threads (downloads at a time) while chunks of those already
+        downloaded are parsed; idle workers take whichever chunk is next, whatever its category
+        Returns the Items of each dataset in turn, in the order of names
+        """
+        start = datetime.now()
+        loaders = [cls(name, keep_details, cache) for name in names]
+        chunks, finished = {}, {}
+        with ThreadPoolExecutor(max_workers=downloads) as downloader, ProcessPoolExecutor(max_workers=workers, initializer=Item.warm_up) as pool:
+            downloading = {downloader.submit(loader.download): loader for loader in loaders}
+            for download in as_completed(downloading):
+                download.result()
+                loader = downloading[download]
+                print(f"Downloaded {loader.name}, parsing {len(loader.dataset):,} datapoints", flush=True)
+                chunks[loader.name] = (datetime.now(), loader.submit_chunks(pool))
+                for future in chunks[loader.name][1]:
+                    future.add_done_callback(lambda future, name=loader.name: finished.__setitem__(name, datetime.now()))
+            results = []
+            for loader in loaders:
+                submitted, futures = chunks[loader.name]
+                items = loader.items_from(loader.table_from([future.result() for future in futures]))
+                seconds = max((finished.get(loader.name, submitted) - submitted).total_seconds(), 1e-6)
+                print(f"Completed {loader.name} with {len(items):,} items from {len(loader.dataset):,} datapoints in {seconds/60:.1f} mins ({len(loader.dataset)/seconds:,.0f} datapoints/sec)", flush=True)
+                results.extend(items)
+        finish = datetime.now()
+        print(f"Completed {len(names)} datasets with {len(results):,} items in {(finish-start).total_seconds()/60:.1f} mins", flush=True)
+        return results
@@ -0,0 +1,118 @@
+import json
+import time
+import sqlite3
+import hashlib
+from typing import List
+import items
+from items import Item
+
+# Bump this when a change to Item parsing would give different results for the same datapoint
+VERSION = 1
+
+# Caches opened by this process, keyed by filename
+open_caches = {}
+
+
+def fingerprint() -> str:
+    """
+    Return a hash of everything that the outcome of parsing depends on, other than the datapoint itself
+    """
+    settings = [VERSION, items.BASE_MODEL, items.MIN_TOKENS, items.MAX_TOKENS, items.MIN_CHARS, items.CEILING_CHARS,
+                Item.PREFIX, Item.QUESTION, Item.REMOVALS]
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+
+def open_cache(filename) -> "ParseCache":
+    """
+    Open the cache in this file, keeping it open for the life of the process
+    """
+    if filename not in open_caches:
+        open_caches[filename] = ParseCache(filename)
+    return open_caches[filename]
+
+
+class ParseCache:
+    """
+    A persistent record of the outcome of parsing each datapoint, keyed by a hash of its contents,
+    so that refreshing a dataset only parses the datapoints that are new or have changed
+    The outcome is whether the Item is included and, if it is, its prompt and token count
+    The cache is emptied whenever the parse settings (MIN_TOKENS, MAX_TOKENS, REMOVALS and so on) change,
+    and the least recently used entries are evicted once it holds more than max_entries
+    """
+
+    def __init__(self, filename, max_entries=5_000_000):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(filename, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            # Take the write lock first, so that of several workers opening a new cache only one empties it
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("CREATE TABLE IF NOT EXISTS state (id INTEGER PRIMARY KEY CHECK (id = 0), fingerprint TEXT, entries INTEGER)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS parses (key BLOB PRIMARY KEY, include INTEGER, prompt TEXT, token_count INTEGER, used REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS parses_used ON parses (used)")
+            row = self.db.execute("SELECT fingerprint FROM state").fetchone()
+            if row is None or row[0] != fingerprint():
+                self.invalidate()
+
+    def invalidate(self):
+        """
+        Empty the cache, recording the current parse settings as the ones its entries were made with
+        """
+        with self.db:
+            self.db.execute("DELETE FROM parses")
+            self.db.execute("INSERT OR REPLACE INTO state VALUES (0, ?, 0)", (fingerprint(),))
+
+    @staticmethod
+    def key_for(datapoint, price) -> bytes:
+        """
+        Hash the parts of this datapoint that parsing depends on
+        """
+        content = [datapoint['title'], datapoint['description'], datapoint['features'], datapoint['details'], price]
+        return hashlib.sha256(json.dumps(content).encode()).digest()
+
+    def parse_batch(self, datapoints, prices, keep_details=True) -> List[Item]:
+        """
+        Equivalent to Item.parse_batch, but only parsing the datapoints that aren't already in the cache
+        """
+        keys = [self.key_for(datapoint, price) for datapoint, price in zip(datapoints, prices)]
+        known = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            query = f"SELECT key, include, prompt, token_count FROM parses WHERE key IN ({','.join('?' * len(batch))})"
+            known.update((row[0], row[1:]) for row in self.db.execute(query, batch))
+        missing = [index for index, key in enumerate(keys) if key not in known]
+        parsed = iter(Item.parse_batch([datapoints[index] for index in missing], [prices[index] for index in missing], keep_details))
+        results = []
+        for datapoint, price, key in zip(datapoints, prices, keys):
+            if key in known:
+                item = Item(datapoint, price, parse=False)
+                include, item.prompt, item.token_count = known[key]
+                item.include = bool(include)
+                if keep_details:
+                    item.details = datapoint['details']
+            else:
+                item = next(parsed)
+            results.append(item)
+        self.record(keys, results, set(known))
+        return results
+
+    def record(self, keys, results, known):
+        """
+        Store the outcome for newly parsed Items and mark the others as recently used
+        then evict the least recently used entries if the cache is over its limit
+        The number of entries is kept up to date in the state row, rather than counted each time
+        """
+        now = time.time()
+        with self.db:
+            before = self.db.total_changes
+            # Another worker may have just stored the same datapoint; its outcome is the same, so keep that one
+            self.db.executemany("INSERT OR IGNORE INTO parses VALUES (?, ?, ?, ?, ?)",
+                [(key, int(item.include), item.prompt, item.token_count, now) for key, item in zip(keys, results) if key not in known])
+            added = self.db.total_changes - before
+            self.db.executemany("UPDATE parses SET used = ? WHERE key = ?", [(now, key) for key in known])
+            self.db.execute("UPDATE state SET entries = entries + ?", (added,))
+            entries = self.db.execute("SELECT entries FROM state").fetchone()[0]
+            if entries > self.max_entries:
+                evicted = self.db.execute("DELETE FROM parses WHERE key IN (SELECT key FROM parses ORDER BY used LIMIT ?)", (entries - self.max_entries,)).rowcount
+                self.db.execute("UPDATE state SET entries = entries - ?", (evicted,))
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import functools
+from typing import List, Optional
+
+# Shared by the week6 and week8 Testers, unless PREDICTION_CACHE says otherwise
+DEFAULT_FILENAME = os.getenv("PREDICTION_CACHE", os.path.expanduser("~/.cache/mastering_llms/predictions.db"))
+
+
+# Values simple enough to tell predictors apart by, with a repr that's the same from one run to the next
+PLAIN = (type(None), bool, int, float, complex, str, bytes)
+
+
+def is_plain(value) -> bool:
+    if isinstance(value, (tuple, list)):
+        return all(is_plain(element) for element in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and is_plain(element) for key, element in value.items())
+    return isinstance(value, PLAIN)
+
+
+def name_of(predictor) -> str:
+    name = getattr(predictor, "__qualname__", type(predictor).__qualname__)
+    return f"{getattr(predictor, '__module__', '')}.{name}"
+
+
+def code_digest(code) -> list:
+    """
+    Return what identifies this code object: its bytecode, constants (including any nested functions) and names
+    """
+    constants = [code_digest(constant) if hasattr(constant, "co_code") else repr(constant) for constant in code.co_consts]
+    return [code.co_code.hex(), constants, code.co_names]
+
+
+def plain_attributes(instance) -> dict:
+    return {key: value for key, value in sorted(getattr(instance, "__dict__", {}).items()) if is_plain(value)}
+
+
+def identity_for(predictor, version=None) -> str:
+    """
+    Return a name for this predictor that stays the same from one run to the next
+    For a function, it includes a hash of its code and of the values it closes over, so that two lambdas,
+    or a function before and after a change, are told apart; for a partial, a hash of its arguments;
+    and for a method or an instance of a class, a hash of the instance's plain attributes (numbers, strings and so on)
+    Pass a version to tell apart predictors with the same name, or to start afresh after changing one;
+    a version is needed for a partial or closure holding values other than plain ones, which can't be hashed reliably
+    """
+    if version is not None:
+        return f"{name_of(predictor)}:{version}"
+    if isinstance(predictor, functools.partial):
+        name, parts = f"{name_of(predictor.func)}.partial", [identity_for(predictor.func), predictor.args, predictor.keywords]
+    elif hasattr(predictor, "__code__"):
+        name = name_of(predictor)
+        try:
+            closure = [cell.cell_contents for cell in predictor.__closure__ or []]
+        except ValueError:
+            closure = None
+        parts = [code_digest(predictor.__code__), closure, plain_attributes(getattr(predictor, "__self__", None))]
+    else:
+        name, parts = name_of(predictor), plain_attributes(predictor)
+    if not is_plain(parts):
+        raise ValueError(f"Pass a version to cache the guesses of {name}, as it holds values that can't identify it from one run to the next")
+    return f"{name}#{hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:12]}"
+
+
+class PredictionCache:
+    """
+    A persistent memo of the price each predictor guessed for each item, so that re-running a Tester
+    doesn't pay again for slow or costly predictors
+    Entries are keyed by the predictor's identity and a hash of the item's title, prompt and price
+    The least recently used entries are evicted once the cache holds more than max_entries
+    It can be shared between Testers running on several threads
+    """
+
+    def __init__(self, filename=DEFAULT_FILENAME, max_entries=1_000_000):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.filename = filename
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("CREATE TABLE IF NOT EXISTS state (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS predictions (predictor TEXT, item BLOB, guess REAL, used REAL, PRIMARY KEY (predictor, item))")
+            self.db.execute("CREATE INDEX IF NOT EXISTS predictions_used ON predictions (used)")
+            self.db.execute("INSERT OR IGNORE INTO state VALUES (0, 0)")
+
+    @staticmethod
+    def key_for(item) -> bytes:
+        """
+        Hash the contents of this item that a predictor might look at
+        """
+        return hashlib.sha256(json.dumps([item.title, item.prompt, item.price]).encode()).digest()
+
+    def get(self, predictor: str, items) -> List[Optional[float]]:
+        """
+        Return the cached guess of this predictor for each item, or None where there isn't one
+        """
+        keys = [self.key_for(item) for item in items]
+        known = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                query = f"SELECT item, guess FROM predictions WHERE predictor = ? AND item IN ({','.join('?' * len(batch))})"
+                known.update(self.db.execute(query, [predictor, *batch]))
+            with self.db:
+                self.db.executemany("UPDATE predictions SET used = ? WHERE predictor = ? AND item = ?", [(time.time(), predictor, key) for key in known])
+        return [known.get(key) for key in keys]
+
+    def put(self, predictor: str, items, guesses):
+        """
+        Record this predictor's guesses for these items, then evict the least recently used entries if over the limit
+        The number of entries is kept up to date in the state row, rather than counted each time
+        """
+        now = time.time()
+        rows = [(predictor, self.key_for(item), float(guess), now) for item, guess in zip(items, guesses)]
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany("INSERT OR IGNORE INTO predictions VALUES (?, ?, ?, ?)", rows)
+            added = self.db.total_changes - before
+            self.db.executemany("UPDATE predictions SET guess = ?, used = ? WHERE predictor = ? AND item = ?",
+                [(guess, used, name, key) for name, key, guess, used in rows])
+            self.db.execute("UPDATE state SET entries = entries + ?", (added,))
+            entries = self.db.execute("SELECT entries FROM state").fetchone()[0]
+            if entries > self.max_entries:
+                evicted = self.db.execute("DELETE FROM predictions WHERE rowid IN (SELECT rowid FROM predictions ORDER BY used LIMIT ?)", (entries - self.max_entries,)).rowcount
+                self.db.execute("UPDATE state SET entries = entries - ?", (evicted,))
+
+    def invalidate(self, predictor: Optional[str] = None):
+        """
+        Forget the guesses of this predictor, or of every predictor if none is given
+        """
+        with self.lock, self.db:
+            if predictor is None:
+                self.db.execute("DELETE FROM predictions")
+                self.db.execute("UPDATE state SET entries = 0")
+            else:
+                removed = self.db.execute("DELETE FROM predictions WHERE predictor = ?", (predictor,)).rowcount
+                self.db.execute("UPDATE state SET entries = entries - ?", (removed,))
@@ -0,0 +1,141 @@
+import pickle
+from typing import List
+import pyarrow as pa
+from items import Item
+
+SCHEMA = pa.schema([
+    ("title", pa.string()),
+    ("price", pa.float64()),
+    ("prompt", pa.string()),
+    ("token_count", pa.int32()),
+    ("category", pa.dictionary(pa.int32(), pa.string())),
+])
+DETAILS_SCHEMA = SCHEMA.append(pa.field("details", pa.string()))
+
+
+class StoredItem(Item):
+    """
+    A read-only Item backed by a row of an ItemStore
+    Fields are only read from the store when they're accessed
+    """
+
+    __slots__ = ("store", "index")
+    include = True
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def field(self, name):
+        return self.store.table.column(name)[self.index].as_py()
+
+    @property
+    def title(self):
+        return self.field("title")
+
+    @property
+    def price(self):
+        return self.field("price")
+
+    @property
+    def prompt(self):
+        return self.field("prompt")
+
+    @property
+    def token_count(self):
+        return self.field("token_count")
+
+    @property
+    def category(self):
+        return self.field("category")
+
+    @property
+    def details(self):
+        return self.field("details") if "details" in self.store.table.schema.names else None
+
+    def __reduce__(self):
+        """
+        Pickle as a plain Item, so the whole store doesn't travel with it
+        """
+        return Item.restore, (self.title, self.price, self.prompt, self.token_count, self.category, self.details)
+
+
+class ItemStore:
+    """
+    A columnar, on-disk collection of Items, memory-mapped so that opening it is near-instant
+    and its pages are shared between every process that opens the same file
+    Indexing returns a StoredItem; slicing returns another ItemStore without copying
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+
+    @classmethod
+    def from_items(cls, items: List[Item], keep_details=False) -> "ItemStore":
+        """
+        Build a store, in memory, from a list of Items
+        """
+        columns = [
+            [item.title for item in items],
+            [item.price for item in items],
+            [item.prompt for item in items],
+            [item.token_count for item in items],
+            pa.array([item.category for item in items]).dictionary_encode(),
+        ]
+        schema = SCHEMA
+        if keep_details:
+            columns.append([item.details for item in items])
+            schema = DETAILS_SCHEMA
+        return cls(pa.Table.from_arrays(columns, schema=schema))
+
+    @classmethod
+    def from_pickle(cls, filename, keep_details=False) -> "ItemStore":
+        """
+        Build a store from a pickled list of Items, such as train.pkl
+        """
+        with open(filename, 'rb') as file:
+            return cls.from_items(pickle.load(file), keep_details)
+
+    @classmethod
+    def open(cls, filename) -> "ItemStore":
+        """
+        Memory-map a store previously written with save
+        """
+        with pa.memory_map(filename, 'r') as source:
+            return cls(pa.ipc.open_file(source).read_all())
+
+    def save(self, filename):
+        """
+        Write this store to disk, uncompressed so that it can be memory-mapped
+        """
+        with pa.OSFile(filename, 'wb') as sink:
+            with pa.ipc.new_file(sink, self.table.schema) as writer:
+                writer.write_table(self.table)
+
+    def column(self, name):
+        """
+        Return a column of the store as a numpy array, or a list for string columns
+        """
+        column = self.table.column(name)
+        return column.to_numpy() if pa.types.is_primitive(column.type) else column.to_pylist()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return ItemStore(self.table.slice(start, max(stop - start, 0)))
+            return ItemStore(self.table.take(list(range(start, stop, step))))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("ItemStore index out of range")
+        return StoredItem(self, key)
+
+    def __iter__(self):
+        return (StoredItem(self, index) for index in range(len(self)))
+
+    def __repr__(self):
+        return f"<ItemStore of {len(self):,} Items>"
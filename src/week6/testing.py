@@ -1,5 +1,11 @@
+import csv
+import json
 import math
-import matplotlib.pyplot as plt
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from prediction_cache import PredictionCache, identity_for
 
 GREEN = "\033[92m"
 YELLOW = "\033[93m"
@@ -7,13 +13,64 @@ RED = "\033[91m"
 RESET = "\033[0m"
 COLOR_MAP = {"red":RED, "orange": YELLOW, "green": GREEN}
 
+class RateLimiter:
+    """
+    Spaces out calls, across threads, so that no more than rate of them start each second
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_start = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(start - now)
+
 class Tester:
+    """
+    Runs a predictor over the first size datapoints and reports how close it gets to the real prices
+    A predictor is called with one datapoint at a time, unless it has a predict_batch method,
+    in which case that is called once with the whole list of datapoints
+    For predictors that make remote calls, workers runs that many calls concurrently,
+    rate limits them to that many calls per second, and retries retries a failed call
+    that many times, backing off between attempts; results are always printed in order
+    Pass cache=True (or a PredictionCache) to reuse guesses from earlier runs of the same predictor;
+    version tells apart predictors with the same name, or starts afresh after changing one
+    With headless=True there is no chart and no line per datapoint, and matplotlib is never imported;
+    instead running totals are printed every progress_every datapoints (or never, if it's None)
+    Pass report_file to save the results: a .csv file gets one row per datapoint,
+    any other name gets JSON with the overall metrics, a breakdown by category and every row
+    Every call is timed, and the report includes the p50/p90/p99 latency, throughput and the number of
+    errors and timeouts; warmup calls are made before the run and left out of the stats
+    A call that takes longer than timeout seconds, or still fails after its retries, raises its error,
+    unless on_error="zero" to score it as a guess of 0 and carry on; that's the default once timeout or retries is set
+    """
 
-    def __init__(self, predictor, data, title=None, size=250):
+    def __init__(self, predictor, data, title=None, size=250, workers=1, rate=None, retries=0, backoff=1.0, cache=None, version=None,
+                 headless=False, report_file=None, progress_every=50, timeout=None, warmup=0, on_error=None):
         self.predictor = predictor
         self.data = data
-        self.title = title or predictor.__name__.replace("_", " ").title()
+        self.title = title or getattr(predictor, "__name__", type(predictor).__name__).replace("_", " ").title()
         self.size = size
+        self.workers = workers
+        self.limiter = RateLimiter(rate) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = PredictionCache() if cache is True else cache
+        self.identity = identity_for(predictor, version) if self.cache else None
+        self.headless = headless
+        self.report_file = report_file
+        self.progress_every = progress_every
+        self.timeout = timeout
+        self.warmup = warmup
+        self.on_error = on_error or ("zero" if timeout is not None or retries else "raise")
+        self.elapsed = 0.0
+        self.latencies = []
+        self.outcomes = []
         self.guesses = []
         self.truths = []
         self.errors = []
@@ -27,27 +84,222 @@ class Tester:
             return "orange"
         else:
             return "red"
-    
-    def run_datapoint(self, i):
-        datapoint = self.data[i]
-        guess = self.predictor(datapoint)
+
+    def colors_for(self, errors, truths):
+        """
+        Vectorised color_for, over arrays of errors and truths
+        """
+        ratios = errors / truths
+        return np.where((errors < 40) | (ratios < 0.2), "green", np.where((errors < 80) | (ratios < 0.4), "orange", "red"))
+
+    def measure(self, guesses, truths):
+        """
+        Return the errors, squared log errors and colors for these guesses
+        Works on arrays of guesses and truths, or on a single one of each
+        """
+        errors = np.abs(guesses - truths)
+        sles = (np.log(truths + 1) - np.log(guesses + 1)) ** 2
+        return errors, sles, self.colors_for(errors, truths)
+
+    def run_datapoint(self, i, datapoint, guess):
         truth = datapoint.price
-        error = abs(guess - truth)
-        log_error = math.log(truth+1) - math.log(guess+1)
-        sle = log_error ** 2
-        color = self.color_for(error, truth)
+        error, sle, color = self.measure(np.float64(guess), truth)
         title = datapoint.title if len(datapoint.title) <= 40 else datapoint.title[:40]+"..."
-        self.guesses.append(guess)
-        self.truths.append(truth)
-        self.errors.append(error)
-        self.sles.append(sle)
-        self.colors.append(color)
-        print(f"{COLOR_MAP[color]}{i+1}: Guess: ${guess:,.2f} Truth: ${truth:,.2f} Error: ${error:,.2f} SLE: {sle:,.2f} Item: {title}{RESET}")
+        print(f"{COLOR_MAP[str(color)]}{i+1}: Guess: ${guess:,.2f} Truth: ${truth:,.2f} Error: ${error:,.2f} SLE: {sle:,.2f} Item: {title}{RESET}")
+
+    def progress(self, i, datapoint, guess):
+        """
+        Add this guess to the running totals, printing them every progress_every datapoints
+        """
+        error, sle, color = self.measure(np.float64(guess), datapoint.price)
+        self.totals += (error, sle, color == "green")
+        count = i + 1
+        if self.progress_every and (count % self.progress_every == 0 or count == self.size):
+            error, sle, hits = self.totals / count
+            print(f"{count}/{self.size}: Error=${error:,.2f} RMSLE={math.sqrt(sle):,.2f} Hits={hits*100:.1f}%", flush=True)
+
+    def predict(self, datapoints):
+        """
+        Return the predictor's guesses for these datapoints, reporting on each one as it arrives
+        The seconds each guess took are kept in latencies, with None for guesses from the cache,
+        and the outcome of each call ("ok", "error", "timeout" or "cached") in outcomes
+        """
+        start = time.perf_counter()
+        guesses = self.cached_guesses(datapoints) if self.cache else self.guesses_for(datapoints)
+        self.totals = np.zeros(3)
+        self.latencies = []
+        self.outcomes = []
+        results = []
+        for i, (datapoint, (guess, latency, outcome)) in enumerate(zip(datapoints, guesses)):
+            if self.headless:
+                self.progress(i, datapoint, guess)
+            else:
+                self.run_datapoint(i, datapoint, guess)
+            results.append(guess)
+            self.latencies.append(latency)
+            self.outcomes.append(outcome)
+        self.elapsed = time.perf_counter() - start
+        return results
+
+    def guesses_for(self, datapoints):
+        """
+        Yield the predictor's guess for each of these datapoints, in order, with the seconds it took and its outcome
+        Predictors with a predict_batch method are called once for all the datapoints,
+        and each guess is charged an equal share of the time
+        """
+        predict_batch = getattr(self.predictor, "predict_batch", None)
+        if predict_batch:
+            start = time.perf_counter()
+            guesses = np.asarray(predict_batch(datapoints), dtype=float)
+            latency = (time.perf_counter() - start) / max(len(datapoints), 1)
+            yield from ((guess, latency, "ok") for guess in guesses)
+        elif self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                yield from pool.map(self.call, datapoints)
+        else:
+            yield from map(self.call, datapoints)
+
+    def cached_guesses(self, datapoints, flush_every=100):
+        """
+        Yield the guesses for these datapoints, only calling the predictor for those not already in the cache
+        """
+        cached = self.cache.get(self.identity, datapoints)
+        fresh = self.guesses_for([datapoint for datapoint, guess in zip(datapoints, cached) if guess is None])
+        pending = []
+        try:
+            for datapoint, guess in zip(datapoints, cached):
+                latency, outcome = None, "cached"
+                if guess is None:
+                    guess, latency, outcome = next(fresh)
+                    if outcome == "ok":
+                        pending.append((datapoint, guess))
+                    if len(pending) >= flush_every:
+                        self.cache.put(self.identity, *zip(*pending))
+                        pending = []
+                yield guess, latency, outcome
+        finally:
+            if pending:
+                self.cache.put(self.identity, *zip(*pending))
+
+    def call(self, datapoint):
+        """
+        Call the predictor for this datapoint, within the rate limit, retrying if it fails
+        Returns the guess, the seconds taken by the last attempt and its outcome: "ok", "error" or "timeout"
+        If the last attempt fails, its error is raised, unless on_error is "zero"
+        """
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.wait()
+            start = time.perf_counter()
+            try:
+                return self.attempt(datapoint), time.perf_counter() - start, "ok"
+            except Exception as error:
+                if attempt == self.retries:
+                    if self.on_error != "zero":
+                        raise
+                    return 0.0, time.perf_counter() - start, "timeout" if isinstance(error, TimeoutError) else "error"
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def attempt(self, datapoint):
+        """
+        Call the predictor once, raising TimeoutError if it takes longer than timeout seconds
+        A call that times out is left to finish in the background, on a daemon thread
+        """
+        if self.timeout is None:
+            return self.predictor(datapoint)
+        result = {}
+        def target():
+            try:
+                result["guess"] = self.predictor(datapoint)
+            except Exception as error:
+                result["error"] = error
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise TimeoutError(f"No guess after {self.timeout} seconds")
+        if "error" in result:
+            raise result["error"]
+        return result["guess"]
+
+    def warm_up(self):
+        """
+        Make warmup calls, on the datapoints after the ones being tested, without recording them
+        """
+        datapoints = [self.data[(self.size + i) % len(self.data)] for i in range(self.warmup)]
+        for _ in self.guesses_for(datapoints):
+            pass
+
+    def evaluate(self, datapoints, guesses):
+        """
+        Compute the errors, squared log errors and colors for all the guesses at once
+        """
+        self.guesses = np.asarray(guesses, dtype=float)
+        self.truths = np.array([datapoint.price for datapoint in datapoints], dtype=float)
+        self.errors, self.sles, self.colors = self.measure(self.guesses, self.truths)
+        self.titles = [datapoint.title for datapoint in datapoints]
+        self.categories = np.array([getattr(datapoint, "category", None) or "Unknown" for datapoint in datapoints])
+
+    def metrics(self, selection=slice(None)):
+        """
+        Return the average error, RMSLE and hit rate over all the guesses, or a selection of them
+        """
+        errors, sles, colors = self.errors[selection], self.sles[selection], self.colors[selection]
+        return {
+            "count": len(errors),
+            "average_error": float(errors.mean()),
+            "rmsle": math.sqrt(sles.mean()),
+            "hit_rate": float(np.mean(colors == "green")),
+        }
+
+    def timings(self):
+        """
+        Return the latency percentiles of the calls that succeeded, in seconds,
+        the calls made per second, and the number of calls, errors and timeouts
+        """
+        outcomes = np.array(self.outcomes)
+        latencies = np.array(self.latencies, dtype=float)[outcomes == "ok"]
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else (None, None, None)
+        calls = int(np.count_nonzero(outcomes != "cached"))
+        return {
+            "calls": calls,
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+            "throughput": calls / self.elapsed if self.elapsed else None,
+            "errors": int(np.count_nonzero(outcomes == "error")),
+            "timeouts": int(np.count_nonzero(outcomes == "timeout")),
+        }
+
+    def rows(self):
+        """
+        Return a dict describing each guess, in order
+        """
+        return [
+            {"index": i + 1, "title": title, "category": str(category), "truth": float(truth), "guess": float(guess),
+             "error": float(error), "sle": float(sle), "color": str(color), "latency": latency, "outcome": outcome}
+            for i, (title, category, truth, guess, error, sle, color, latency, outcome)
+            in enumerate(zip(self.titles, self.categories, self.truths, self.guesses, self.errors, self.sles, self.colors, self.latencies, self.outcomes))
+        ]
+
+    def save_report(self, filename):
+        """
+        Save the results to a .csv file with a row per guess, or otherwise to a JSON file
+        """
+        rows = self.rows()
+        with open(filename, "w", newline="") as file:
+            if filename.endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                categories = {str(category): self.metrics(self.categories == category) for category in np.unique(self.categories)}
+                json.dump({"title": self.title, **self.metrics(), "timings": self.timings(), "categories": categories, "items": rows}, file, indent=2)
 
     def chart(self, title):
-        max_error = max(self.errors)
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 8))
-        max_val = max(max(self.truths), max(self.guesses))
+        max_val = max(self.truths.max(), self.guesses.max())
         plt.plot([0, max_val], [0, max_val], color='deepskyblue', lw=2, alpha=0.6)
         plt.scatter(self.truths, self.guesses, s=3, c=self.colors)
         plt.xlabel('Ground Truth')
@@ -58,18 +310,33 @@ class Tester:
         plt.show()
 
     def report(self):
-        average_error = sum(self.errors) / self.size
-        rmsle = math.sqrt(sum(self.sles) / self.size)
-        hits = sum(1 for color in self.colors if color=="green")
+        average_error = self.errors.mean()
+        rmsle = math.sqrt(self.sles.mean())
+        hits = np.count_nonzero(self.colors == "green")
         title = f"{self.title} Error=${average_error:,.2f} RMSLE={rmsle:,.2f} Hits={hits/self.size*100:.1f}%"
-        self.chart(title)
+        timings = self.timings()
+        stats = []
+        if timings["p50"] is not None:
+            stats.append(f"p50={timings['p50']*1000:,.0f}ms p90={timings['p90']*1000:,.0f}ms p99={timings['p99']*1000:,.0f}ms")
+        if timings["throughput"] is not None:
+            stats.append(f"Throughput={timings['throughput']:,.1f}/s")
+        stats.append(f"Errors={timings['errors']} Timeouts={timings['timeouts']}")
+        title += "\n" + " ".join(stats)
+        if self.report_file:
+            self.save_report(self.report_file)
+        if self.headless:
+            print(title)
+        else:
+            self.chart(title)
 
     def run(self):
         self.error = 0
-        for i in range(self.size):
-            self.run_datapoint(i)
+        datapoints = [self.data[i] for i in range(self.size)]
+        if self.warmup:
+            self.warm_up()
+        self.evaluate(datapoints, self.predict(datapoints))
         self.report()
 
     @classmethod
-    def test(cls, function, data):
-        cls(function, data).run()
\ No newline at end of file
+    def test(cls, function, data, size=250, **options):
+        cls(function, data, size=size, **options).run()
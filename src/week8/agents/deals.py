@@ -1,11 +1,13 @@
 from pydantic import BaseModel
-from typing import List, Dict, Self
-from bs4 import BeautifulSoup
-import re
+from typing import List, Dict, Set, Self
+import logging
 import feedparser
 from tqdm import tqdm
-import requests
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from agents.fetcher import Fetcher
+from agents.http_cache import HttpCache
+from agents.extraction import extractor
 
 feeds = [
     "https://www.dealnews.com/c142/Electronics/?rss=1",
@@ -17,19 +19,19 @@ feeds = [
 
 def extract(html_snippet: str) -> str:
     """
-    Use Beautiful Soup to clean up this HTML snippet and extract useful text
+    Clean up this HTML snippet and extract useful text, with the chosen extraction engine
     """
-    soup = BeautifulSoup(html_snippet, 'html.parser')
-    snippet_div = soup.find('div', class_='snippet summary')
-    
-    if snippet_div:
-        description = snippet_div.get_text(strip=True)
-        description = BeautifulSoup(description, 'html.parser').get_text()
-        description = re.sub('<[^<]+?>', '', description)
-        result = description.strip()
-    else:
-        result = html_snippet
-    return result.replace('\n', ' ')
+    return extractor().summary(html_snippet)
+
+def read_feed(feed_url: str, fetcher: Fetcher) -> List[Dict]:
+    """
+    Return the entries of this RSS feed, or none if it can't be fetched
+    """
+    try:
+        return feedparser.parse(fetcher.get(feed_url, ttl=0)).entries
+    except Exception as error:
+        logging.warning(f"Skipping feed {feed_url}: {error!r}")
+        return []
 
 class ScrapedDeal:
     """
@@ -42,22 +44,55 @@ class ScrapedDeal:
     details: str
     features: str
 
-    def __init__(self, entry: Dict[str, str]):
+    # Where responses are cached between runs; None to fetch everything afresh
+    CACHE = "http_cache.db"
+    # Bump this when read_page changes, so that pages already in the cache are read again
+    READER_VERSION = 1
+
+    # The one Fetcher that scans share, so its connection pool and cache stay open from one scan to the next
+    _fetcher = None
+    _fetcher_lock = threading.Lock()
+
+    def __init__(self, entry: Dict[str, str], fetcher: Fetcher = None):
         """
         Populate this instance based on the provided dict
+        This is cheap: the deal's page isn't fetched until its details or features are needed
         """
         self.title = entry['title']
         self.summary = extract(entry['summary'])
         self.url = entry['links'][0]['href']
-        stuff = requests.get(self.url).content
-        soup = BeautifulSoup(stuff, 'html.parser')
-        content = soup.find('div', class_='content-section').get_text()
+        self.fetcher = fetcher
+        self._details = None
+        self._features = None
+
+    def load(self) -> Self:
+        """
+        Fetch this deal's page and read its details and features from it, if that hasn't been done already
+        """
+        if self._details is None:
+            parser = f"ScrapedDeal.read_page:{self.READER_VERSION}:{extractor().name}"
+            self._details, self._features = (self.fetcher or self.shared_fetcher()).parse(self.url, self.read_page, parser=parser)
+        return self
+
+    @staticmethod
+    def read_page(stuff: bytes) -> List[str]:
+        """
+        Return the details and features from the content section of a deal's page
+        """
+        content = extractor().content_section(stuff)
         content = content.replace('\nmore', '').replace('\n', ' ')
         if "Features" in content:
-            self.details, self.features = content.split("Features")
-        else:
-            self.details = content
-            self.features = ""
+            details, features = content.split("Features")
+            return [details, features]
+        return [content, ""]
+
+    @property
+    def details(self) -> str:
+        return self.load()._details
+
+    @property
+    def features(self) -> str:
+        return self.load()._features
 
     def __repr__(self):
         """
@@ -65,25 +100,53 @@ class ScrapedDeal:
         """
         return f"<{self.title}>"
 
-    def describe(self):
+    def describe(self, details: str = None, features: str = None):
         """
         Return a longer string to describe this deal for use in calling a model
+        Shortened details and features can be given to use in place of the deal's own
+        """
+        details = self.details if details is None else details
+        features = self.features if features is None else features
+        return f"Title: {self.title}\nDetails: {details.strip()}\nFeatures: {features.strip()}\nURL: {self.url}"
+
+    @classmethod
+    def shared_fetcher(cls) -> Fetcher:
+        """
+        Return the Fetcher that deals are fetched through, creating it, with its cache, the first time
         """
-        return f"Title: {self.title}\nDetails: {self.details.strip()}\nFeatures: {self.features.strip()}\nURL: {self.url}"
+        with cls._fetcher_lock:
+            if cls._fetcher is None:
+                cls._fetcher = Fetcher(cache=HttpCache(cls.CACHE) if cls.CACHE else None)
+            return cls._fetcher
 
     @classmethod
-    def fetch(cls, show_progress : bool = False) -> List[Self]:
-        """
-        Retrieve all deals from the selected RSS feeds
-        """
-        deals = []
-        feed_iter = tqdm(feeds) if show_progress else feeds
-        for feed_url in feed_iter:
-            feed = feedparser.parse(feed_url)
-            for entry in feed.entries[:10]:
-                deals.append(cls(entry))
-                time.sleep(0.5)
-        return deals
+    def from_feeds(cls, fetcher: Fetcher, workers: int = 8) -> List[Self]:
+        """
+        Read the selected RSS feeds, concurrently, into deals whose pages haven't been fetched yet
+        """
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [cls(entry, fetcher) for entries in pool.map(lambda feed_url: read_feed(feed_url, fetcher), feeds) for entry in entries[:10]]
+
+    @classmethod
+    def fetch(cls, show_progress : bool = False, workers: int = 8, skip: Set[str] = frozenset()) -> List[Self]:
+        """
+        Retrieve all deals from the selected RSS feeds, other than those whose URL is in skip
+        The feeds, and then the pages of the remaining deals, are fetched concurrently through the shared Fetcher,
+        which keeps the requests to each host within its rate limit; feeds are revalidated every time,
+        while pages fetched within the cache's ttl are reused without a request
+        Deals whose page can't be fetched or read are left out
+        """
+        fetcher = cls.shared_fetcher()
+        deals = [deal for deal in cls.from_feeds(fetcher, workers) if deal.url not in skip]
+        loaded = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(deal.load) for deal in deals]
+            for deal, future in zip(deals, tqdm(futures) if show_progress else futures):
+                try:
+                    loaded.append(future.result())
+                except Exception as error:
+                    logging.warning(f"Skipping deal {deal.title!r}: {error!r}")
+        return loaded
 
 class Deal(BaseModel):
     """
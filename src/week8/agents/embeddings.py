@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+import numpy as np
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class Embeddings:
+    """
+    A vector encoding model shared by every Agent in the process
+    The SentenceTransformer is loaded the first time it's needed, and the vector for each description
+    is kept in an LRU cache, so that agents pricing the same deal only encode it once between them -
+    even if they ask at the same moment
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_entries=10_000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.vectors = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self._model = None
+
+    @property
+    def model(self):
+        with self.load_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    def encode(self, descriptions: List[str]) -> np.ndarray:
+        """
+        Return a matrix with the vector for each description, encoding any new ones together in one call
+        """
+        owned = {}
+        with self.lock:
+            futures = []
+            for description in descriptions:
+                future = self.vectors.get(description)
+                if future is None:
+                    future = Future()
+                    owned[description] = future
+                    self.vectors[description] = future
+                else:
+                    self.vectors.move_to_end(description)
+                futures.append(future)
+            while len(self.vectors) > self.max_entries:
+                self.vectors.popitem(last=False)
+        if owned:
+            try:
+                vectors = self.model.encode(list(owned))
+            except Exception as error:
+                with self.lock:
+                    for description, future in owned.items():
+                        if self.vectors.get(description) is future:
+                            del self.vectors[description]
+                for future in owned.values():
+                    future.set_exception(error)
+                raise
+            for future, vector in zip(owned.values(), vectors):
+                future.set_result(vector)
+        return np.stack([future.result() for future in futures])
+
+
+shared = {}
+shared_lock = threading.Lock()
+
+
+def shared_embeddings(model_name=MODEL_NAME) -> Embeddings:
+    """
+    Return the one Embeddings for this model in this process, creating it if need be
+    """
+    with shared_lock:
+        if model_name not in shared:
+            shared[model_name] = Embeddings(model_name)
+        return shared[model_name]
@@ -1,3 +1,7 @@
+import time
+import threading
+from typing import List
+import numpy as np
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 import joblib
@@ -11,7 +15,10 @@ class EnsembleAgent(Agent):
 
     name = "Ensemble Agent"
     color = Agent.YELLOW
-    
+
+    # Seconds to wait for each model before carrying on without it
+    TIMEOUTS = {'Specialist': 60, 'Frontier': 30, 'RandomForest': 10}
+
     def __init__(self, collection):
         """
         Create an instance of Ensemble, by creating each of the models
@@ -24,25 +31,83 @@ class EnsembleAgent(Agent):
         self.model = joblib.load('ensemble_model.pkl')
         self.log("Ensemble Agent is ready")
 
+    @staticmethod
+    def call_in_background(name, function, descriptions):
+        """
+        Start function(descriptions) on a daemon thread of its own, so that a call that hangs holds up nothing else
+        :return: the thread, and a dict that gets the call's estimates, or its error, when it finishes
+        """
+        result = {}
+        def target():
+            try:
+                result["estimates"] = function(descriptions)
+            except Exception as error:
+                result["error"] = error
+        thread = threading.Thread(target=target, name=f"ensemble-{name}", daemon=True)
+        thread.start()
+        return thread, result
+
+    def estimates(self, descriptions: List[str]) -> dict:
+        """
+        Ask the 3 models to price the products at the same time, waiting up to each one's timeout
+        Each model prices the whole batch in one pass, on a thread of its own; a call that times out
+        is left to finish in the background, without taking a thread from the next batch
+        :param descriptions: the descriptions of the products
+        :return: the estimates of each model that answered in time, by name
+        """
+        start = time.monotonic()
+        calls = {
+            'Specialist': self.call_in_background('Specialist', self.specialist.price_batch, descriptions),
+            'Frontier': self.call_in_background('Frontier', self.frontier.price_batch, descriptions),
+            'RandomForest': self.call_in_background('RandomForest', self.random_forest.price_batch, descriptions),
+        }
+        estimates = {}
+        for name, (thread, result) in calls.items():
+            thread.join(max(0, start + self.TIMEOUTS[name] - time.monotonic()))
+            if thread.is_alive():
+                self.log(f"Ensemble Agent is carrying on without the {name} model: no answer after {self.TIMEOUTS[name]} seconds")
+            elif "error" in result:
+                self.log(f"Ensemble Agent is carrying on without the {name} model: {result['error']!r}")
+            else:
+                estimates[name] = np.asarray(result["estimates"], dtype=float)
+        return estimates
+
     def price(self, description: str) -> float:
         """
         Run this ensemble model
-        Ask each of the models to price the product
+        Ask each of the models to price the product, concurrently
         Then use the Linear Regression model to return the weighted price
+        A model that fails or times out is given the average of the others' estimates
         :param description: the description of a product
         :return: an estimate of its price
         """
+        return self.price_batch([description])[0]
+
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Run this ensemble model over several products at once
+        Each model prices all of them in one pass, and the Linear Regression weighs them in one prediction
+        :param descriptions: the descriptions of the products
+        :return: an estimate of each one's price
+        """
         self.log("Running Ensemble Agent - collaborating with specialist, frontier and random forest agents")
-        specialist = self.specialist.price(description)
-        frontier = self.frontier.price(description)
-        random_forest = self.random_forest.price(description)
+        if not descriptions:
+            return []
+        estimates = self.estimates(descriptions)
+        if not estimates:
+            self.log("Ensemble Agent has no estimates to combine - returning $0.00")
+            return [0.0] * len(descriptions)
+        imputed = np.mean(list(estimates.values()), axis=0)
+        specialist = estimates.get('Specialist', imputed)
+        frontier = estimates.get('Frontier', imputed)
+        random_forest = estimates.get('RandomForest', imputed)
         X = pd.DataFrame({
-            'Specialist': [specialist],
-            'Frontier': [frontier],
-            'RandomForest': [random_forest],
-            'Min': [min(specialist, frontier, random_forest)],
-            'Max': [max(specialist, frontier, random_forest)],
+            'Specialist': specialist,
+            'Frontier': frontier,
+            'RandomForest': random_forest,
+            'Min': np.minimum.reduce([specialist, frontier, random_forest]),
+            'Max': np.maximum.reduce([specialist, frontier, random_forest]),
         })
-        y = self.model.predict(X)[0]
-        self.log(f"Ensemble Agent complete - returning ${y:.2f}")
-        return y
\ No newline at end of file
+        y = self.model.predict(X).tolist()
+        self.log(f"Ensemble Agent complete - returning {', '.join(f'${price:.2f}' for price in y)}")
+        return y
@@ -0,0 +1,224 @@
+"""
+Engines for pulling the text out of deal summaries and deal pages, all giving the same text as the original
+html.parser code, and a benchmark to check that and time them
+
+Benchmark on saved pages:  python -m agents.extraction http_cache.db   (or a directory of .html files)
+"""
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import feedparser
+from bs4 import BeautifulSoup, UnicodeDammit
+from bs4.builder import HTMLTreeBuilder
+
+
+class Extractor:
+    """
+    The original approach: parse the whole of the markup with html.parser, then search it
+    """
+
+    name = "html.parser"
+    features = "html.parser"
+
+    def find(self, markup, class_):
+        """
+        Return the first div with this class in the markup, or None
+        """
+        return BeautifulSoup(markup, self.features).find('div', class_=class_)
+
+    def plain(self, text: str) -> str:
+        """
+        Parse this text as HTML and return the text again, as the summary cleanup does
+        """
+        return BeautifulSoup(text, 'html.parser').get_text()
+
+    def summary(self, html_snippet: str) -> str:
+        """
+        Clean up the HTML snippet of an RSS entry and extract useful text
+        """
+        snippet_div = self.find(html_snippet, 'snippet summary')
+        if snippet_div:
+            description = snippet_div.get_text(strip=True)
+            description = self.plain(description)
+            description = re.sub('<[^<]+?>', '', description)
+            result = description.strip()
+        else:
+            result = html_snippet
+        return result.replace('\n', ' ')
+
+    def content_section(self, page) -> str:
+        """
+        Return the text of the content section of a deal's page
+        """
+        section = self.find(page, 'content-section')
+        if section is None:
+            raise ValueError("The page has no content section")
+        return section.get_text()
+
+
+class TargetedExtractor(Extractor):
+    """
+    Cuts the div being looked for out of the markup, with a scan for its opening tag and the div that closes it,
+    then parses just that fragment; whenever the scan can't be sure that html.parser would build the same div -
+    it might sit in a comment or script, its markup might be malformed, or it might close one of its
+    ancestors early - the markup is parsed in full instead
+    It also skips parsing the summary text again when there's nothing in it to parse
+    """
+
+    name = "targeted"
+
+    # Comments, scripts and styles, whose contents html.parser doesn't read as tags
+    SKIPPED = re.compile(r'<!--|<(script|style)(?=[\s/>])', re.I)
+    # Anything before the div that could change how html.parser reads it: a tag left open until the next one,
+    # a quoted attribute holding < or >, a class written with an entity, or some other kind of declaration
+    UNSURE = re.compile(r'<[/a-z][^<>]*<|<[a-z][^<>]*?=\s*(["\'])[^"\']*[<>]|\sclass\s*=\s*["\']?[^"\'>]*&|<!(?!--|doctype)|<\?', re.I)
+    CLASSES = re.compile(r'\sclass\s*=', re.I)
+    TAGS = re.compile(r'<(/?)([a-z][^\s/>]*)[^>]*?(/?)>', re.I)
+    RAW = re.compile(r'<(?:script|style|textarea|title|xmp|iframe|noembed|noframes|plaintext)\b|<!|<\?|</(?![a-z])', re.I)
+    # Markup within the div that the scan could misread: a tag left open, a quoted attribute holding < or >,
+    # or an unquoted attribute value ending in /, which html.parser keeps in the value rather than closing the tag
+    TANGLED = re.compile(r'<[/a-z][^<>]*(?:<|$)|<[a-z][^<>]*?=\s*(["\'])[^"\']*[<>]|<[a-z][^<>]*?=\s*[^\s"\'<>]*/>', re.I)
+
+    def opening(self, markup: str, class_: str):
+        """
+        Return the match of the opening tag of the first div with this class, or None if it can't be found for sure
+        """
+        lower = markup.lower()
+        word = class_.split()[0]
+        position = 0
+        while True:
+            found = markup.find(word, position)
+            skipped = self.SKIPPED.search(markup, position)
+            if found == -1:
+                return None
+            if skipped is not None and skipped.start() < found:
+                if self.UNSURE.search(markup, position, skipped.start() + 1):
+                    return None
+                closing = '-->' if skipped.group(1) is None else f'</{skipped.group(1).lower()}'
+                position = lower.find(closing, skipped.end())
+                if position == -1:
+                    return None
+                continue
+            start = markup.rfind('<', 0, found)
+            if start < position or self.UNSURE.search(markup, position, start + 1):
+                return None
+            if any(lower.rfind(f'<{name}', 0, start) > lower.rfind(f'</{name}', 0, start) for name in ('title', 'textarea')):
+                return None
+            pattern = rf'<(?i:div)\s(?:[^>]*?\s)?(?i:class)\s*=\s*(["\']){re.escape(class_)}\1[^>]*>'
+            opening = re.compile(pattern).match(markup, start)
+            if opening is None or opening.end() <= found or len(self.CLASSES.findall(opening.group(0))) != 1:
+                return None
+            return opening
+
+    def fragment(self, markup: str, class_: str):
+        """
+        Return the markup of the first div with this class, or None if it can't be cut out safely
+        The tags after its opening tag are followed as html.parser's tree builder would: an end tag closes
+        the most recent element with its name, and everything opened since; the div ends when it's closed
+        An end tag for something not opened within the div would close one of its ancestors, and the div
+        along with it, so it means parsing the whole page
+        """
+        opening = self.opening(markup, class_)
+        if opening is None or opening.group(0).endswith('/>'):
+            return None
+        opened, end = ['div'], len(markup)
+        for tag in self.TAGS.finditer(markup, opening.end()):
+            closing, name, empty = tag.groups()
+            name = name.lower()
+            if closing:
+                if name not in opened:
+                    return None
+                del opened[len(opened) - 1 - opened[::-1].index(name):]
+                if not opened:
+                    end = tag.end()
+                    break
+            elif not empty and name not in HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS:
+                opened.append(name)
+        fragment = markup[opening.start():end]
+        if self.RAW.search(fragment) or self.TANGLED.search(fragment):
+            return None
+        return fragment
+
+    def find(self, markup, class_):
+        text = markup if isinstance(markup, str) else UnicodeDammit(markup, is_html=True).unicode_markup
+        fragment = self.fragment(text, class_) if text is not None else None
+        return super().find(markup if fragment is None else fragment, class_)
+
+    def plain(self, text: str) -> str:
+        if '<' in text or '&' in text:
+            return super().plain(text)
+        return text
+
+
+ENGINES = {engine.name: engine for engine in (Extractor(), TargetedExtractor())}
+
+# The engine the deal scraper uses, unless told otherwise
+DEFAULT = os.getenv("DEAL_HTML_ENGINE", "targeted")
+
+
+def extractor(name=None) -> Extractor:
+    """
+    Return the engine with this name, or the default one
+    """
+    return ENGINES[name or DEFAULT]
+
+
+def corpus(source):
+    """
+    Return the deal pages and RSS summaries saved in an HttpCache file, or the .html files in a directory
+    """
+    if os.path.isdir(source):
+        pages = []
+        for filename in sorted(os.listdir(source)):
+            if filename.endswith(".html"):
+                with open(os.path.join(source, filename), 'rb') as file:
+                    pages.append(file.read())
+        return pages, []
+    pages, summaries = [], []
+    for url, content in sqlite3.connect(source).execute("SELECT url, content FROM responses"):
+        if "rss=1" in url:
+            summaries += [entry['summary'] for entry in feedparser.parse(content).entries]
+        else:
+            pages.append(content)
+    return pages, summaries
+
+
+def outcome(read, markup):
+    """
+    Return the text read from this markup, or the type of error that reading it raised
+    """
+    try:
+        return read(markup)
+    except Exception as error:
+        return type(error)
+
+
+def benchmark(pages, summaries, repeats=3):
+    """
+    Time each engine on the pages and summaries, checking its text against the original html.parser approach
+    (a page the original can't read counts as identical if the engine raises the same error)
+    """
+    reference = ENGINES["html.parser"]
+    expected_pages = [outcome(reference.content_section, page) for page in pages]
+    expected_summaries = [outcome(reference.summary, summary) for summary in summaries]
+    print(f"{len(pages)} pages and {len(summaries)} summaries")
+    for engine in ENGINES.values():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            results_pages = [outcome(engine.content_section, page) for page in pages]
+        page_time = (time.perf_counter() - start) / repeats / max(len(pages), 1)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            results_summaries = [outcome(engine.summary, summary) for summary in summaries]
+        summary_time = (time.perf_counter() - start) / repeats / max(len(summaries), 1)
+        same_pages = sum(mine == theirs for mine, theirs in zip(results_pages, expected_pages))
+        same_summaries = sum(mine == theirs for mine, theirs in zip(results_summaries, expected_summaries))
+        print(f"{engine.name:>12}: {page_time * 1000:8.2f}ms per page ({same_pages}/{len(pages)} identical), "
+              f"{summary_time * 1000:6.3f}ms per summary ({same_summaries}/{len(summaries)} identical)")
+
+
+if __name__=="__main__":
+    benchmark(*corpus(sys.argv[1] if len(sys.argv) > 1 else "http_cache.db"))
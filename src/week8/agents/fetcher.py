@@ -0,0 +1,114 @@
+import time
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from agents.http_cache import HttpCache, CachedResponse
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to each host, across threads, so that no more than rate of them start each second
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_start = {}
+
+    def wait(self, host):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + self.interval
+        time.sleep(start - now)
+
+
+class Fetcher:
+    """
+    A polite HTTP client to share between threads: requests go through one keep-alive connection pool,
+    are rate limited per host, give up after timeout seconds, and are retried, backing off between attempts
+    Given an HttpCache, responses are kept between runs and revalidated with conditional requests
+    """
+
+    RATE = 2.0
+    TIMEOUT = (5, 20)
+    RETRIES = 2
+    BACKOFF = 1.0
+    POOL_SIZE = 16
+    HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; deal-scanner)"}
+
+    def __init__(self, rate=RATE, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF, cache: HttpCache = None):
+        self.cache = cache
+        self.limiter = HostRateLimiter(rate)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.headers.update(self.HEADERS)
+        adapter = HTTPAdapter(pool_connections=self.POOL_SIZE, pool_maxsize=self.POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, url, headers=None) -> requests.Response:
+        """
+        Make a GET request for this url, within the host's rate limit, retrying if it fails
+        Server errors and 429s count as failures; other responses are returned as they are
+        """
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(host)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+                response.raise_for_status()
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def get(self, url, ttl=None) -> bytes:
+        """
+        Return the content at this url, raising an HTTPError if the request doesn't succeed
+        With a cache, a response younger than ttl seconds (the cache's ttl by default) is used as it is
+        """
+        if self.cache is None:
+            response = self.request(url)
+            response.raise_for_status()
+            return response.content
+        return self.cached_response(url, ttl).content
+
+    def parse(self, url, parse, ttl=None, parser=None):
+        """
+        Return parse(content) for the content at this url, reusing the cached result while the content is unchanged
+        and it came from the same parser: a name for the parsing code, by default the name of the parse function;
+        give it a version that changes along with the code
+        The result must be something JSON can hold
+        """
+        if self.cache is None:
+            return parse(self.get(url))
+        parser = parser or f"{parse.__module__}.{parse.__qualname__}"
+        response = self.cached_response(url, ttl)
+        if response.parsed is None or response.parser != parser:
+            response.parsed = parse(response.content)
+            response.parser = parser
+            self.cache.remember(url, response.parsed, parser)
+        return response.parsed
+
+    def cached_response(self, url, ttl=None) -> CachedResponse:
+        """
+        Return the cached response for this url if it's recent enough, or if the server says it hasn't changed,
+        otherwise fetch and cache it afresh
+        """
+        cached = self.cache.get(url)
+        if cached and cached.age() < (self.cache.ttl if ttl is None else ttl):
+            return cached
+        response = self.request(url, cached.validators() if cached else None)
+        if response.status_code == 304 and cached:
+            self.cache.refresh(url)
+            return cached
+        response.raise_for_status()
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        self.cache.put(url, response.content, etag, last_modified)
+        return CachedResponse(url, response.content, None, etag, last_modified, time.time())
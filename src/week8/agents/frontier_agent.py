@@ -5,13 +5,15 @@ import re
 import math
 import json
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from sentence_transformers import SentenceTransformer
 from datasets import load_dataset
 import chromadb
 from items import Item
 from testing import Tester
 from agents.agent import Agent
+from agents.embeddings import shared_embeddings
+from agents.vector_index import VectorIndex
 
 
 class FrontierAgent(Agent):
@@ -20,6 +22,7 @@ class FrontierAgent(Agent):
     color = Agent.BLUE
 
     MODEL = "gpt-4o-mini"
+    WORKERS = 5
     
     def __init__(self, collection):
         """
@@ -29,7 +32,7 @@ class FrontierAgent(Agent):
         self.log("Initializing Frontier Agent")
         self.openai = OpenAI()
         self.collection = collection
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        self.model = shared_embeddings()
         self.log("Frontier Agent is ready")
 
     def make_context(self, similars: List[str], prices: List[float]) -> str:
@@ -63,18 +66,41 @@ class FrontierAgent(Agent):
             {"role": "assistant", "content": "Price is $"}
         ]
 
+    def query(self, vectors, n_results=5) -> dict:
+        """
+        Look up the nearest products to these vectors, in the Chroma collection or a VectorIndex exported from it
+        A VectorIndex takes the array as it is, sparing the conversion to lists of floats that Chroma needs
+        """
+        embeddings = vectors if isinstance(self.collection, VectorIndex) else vectors.astype(float).tolist()
+        return self.collection.query(query_embeddings=embeddings, n_results=n_results)
+
     def find_similars(self, description: str):
         """
         Return a list of items similar to the given one by looking in the Chroma datastore
         """
         self.log("Frontier Agent is performing a RAG search of the Chroma datastore to find 5 similar products")
         vector = self.model.encode([description])
-        results = self.collection.query(query_embeddings=vector.astype(float).tolist(), n_results=5)
+        results = self.query(vector)
         documents = results['documents'][0][:]
         prices = [m['price'] for m in results['metadatas'][0][:]]
         self.log("Frontier Agent has found similar products")
         return documents, prices
 
+    def find_similars_batch(self, descriptions: List[str]):
+        """
+        Return the similar items and their prices for each of several descriptions,
+        encoding them together and looking them all up in one query of the Chroma datastore
+        """
+        self.log(f"Frontier Agent is performing a RAG search of the Chroma datastore for {len(descriptions)} products")
+        vectors = self.model.encode(descriptions)
+        results = self.query(vectors)
+        similars = [
+            (documents, [m['price'] for m in metadatas])
+            for documents, metadatas in zip(results['documents'], results['metadatas'])
+        ]
+        self.log("Frontier Agent has found similar products")
+        return similars
+
     def get_price(self, s) -> float:
         """
         A utility that plucks a floating point number out of a string
@@ -92,6 +118,14 @@ class FrontierAgent(Agent):
         """
         documents, prices = self.find_similars(description)
         self.log("Frontier Agent is about to call OpenAI with context including 5 similar products")
+        result = self.estimate(description, documents, prices)
+        self.log(f"Frontier Agent completed - predicting ${result:.2f}")
+        return result
+
+    def estimate(self, description: str, documents: List[str], prices: List[float]) -> float:
+        """
+        Ask OpenAI for the price of the described product, given similar products as context
+        """
         response = self.openai.chat.completions.create(
             model=self.MODEL, 
             messages=self.messages_for(description, documents, prices),
@@ -99,7 +133,17 @@ class FrontierAgent(Agent):
             max_tokens=5
         )
         reply = response.choices[0].message.content
-        result = self.get_price(reply)
-        self.log(f"Frontier Agent completed - predicting ${result:.2f}")
-        return result
+        return self.get_price(reply)
+
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Estimate the prices of several products, with a single RAG search for all of them
+        and then concurrent calls to OpenAI, WORKERS at a time
+        """
+        similars = self.find_similars_batch(descriptions)
+        self.log(f"Frontier Agent is about to call OpenAI for {len(descriptions)} products with context including 5 similar products")
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            results = list(pool.map(self.estimate, descriptions, *zip(*similars)))
+        self.log(f"Frontier Agent completed - predicting {', '.join(f'${result:.2f}' for result in results)}")
+        return results
         
\ No newline at end of file
@@ -0,0 +1,107 @@
+import json
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+
+class CachedResponse:
+    """
+    What the HttpCache holds for a URL: the content, what was parsed from it and by which parser,
+    and how to revalidate it
+    """
+
+    def __init__(self, url, content, parsed, etag, last_modified, fetched, parser=None):
+        self.url = url
+        self.content = content
+        self.parsed = parsed
+        self.parser = parser
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = fetched
+
+    def age(self) -> float:
+        return time.time() - self.fetched
+
+    def validators(self) -> dict:
+        """
+        Return the headers that make a request for this URL conditional on it having changed
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    A persistent cache of HTTP responses, keyed by URL, for the Fetcher to revalidate with conditional requests
+    Alongside each response's content it keeps what was parsed from it (anything JSON can hold) and the name
+    of the parser, so that a page that hasn't changed doesn't need parsing again, unless the parser has changed
+    Responses younger than ttl seconds are used without asking the server; entries that haven't been
+    used for max_age seconds are dropped, and the least recently used go once the content exceeds max_bytes
+    """
+
+    TTL = 3600
+    MAX_AGE = 7 * 24 * 3600
+    MAX_BYTES = 200_000_000
+
+    def __init__(self, filename="http_cache.db", ttl=TTL, max_age=MAX_AGE, max_bytes=MAX_BYTES):
+        self.filename = filename
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, content BLOB, parsed TEXT, etag TEXT, last_modified TEXT, fetched REAL, used REAL, size INTEGER, parser TEXT)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+
+    def get(self, url) -> Optional[CachedResponse]:
+        """
+        Return what's cached for this URL, or None
+        """
+        with self.lock:
+            row = self.db.execute("SELECT content, parsed, etag, last_modified, fetched, parser FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            with self.db:
+                self.db.execute("UPDATE responses SET used = ? WHERE url = ?", (time.time(), url))
+        content, parsed, etag, last_modified, fetched, parser = row
+        return CachedResponse(url, content, None if parsed is None else json.loads(parsed), etag, last_modified, fetched, parser)
+
+    def put(self, url, content, etag=None, last_modified=None, parsed=None, parser=None):
+        """
+        Store a fresh response for this URL, replacing whatever was there, then evict as needed
+        """
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO responses (url, content, parsed, etag, last_modified, fetched, used, size, parser) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, content, None if parsed is None else json.dumps(parsed), etag, last_modified, now, now, len(content), parser))
+            self.evict(now)
+
+    def refresh(self, url):
+        """
+        Record that the server has just confirmed the cached response for this URL is still current
+        """
+        with self.lock, self.db:
+            self.db.execute("UPDATE responses SET fetched = ? WHERE url = ?", (time.time(), url))
+
+    def remember(self, url, parsed, parser=None):
+        """
+        Store what was parsed from the cached response for this URL, and the name of the parser
+        """
+        with self.lock, self.db:
+            self.db.execute("UPDATE responses SET parsed = ?, parser = ? WHERE url = ?", (json.dumps(parsed), parser, url))
+
+    def evict(self, now):
+        self.db.execute("DELETE FROM responses WHERE used < ?", (now - self.max_age,))
+        self.db.execute("""DELETE FROM responses WHERE url IN (
+            SELECT url FROM (SELECT url, SUM(size) OVER (ORDER BY used DESC, url) AS total FROM responses) WHERE total > ?)""", (self.max_bytes,))
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM responses")
@@ -0,0 +1,71 @@
+import re
+from typing import List
+import tiktoken
+from agents.deals import ScrapedDeal
+
+# A dollar amount that looks like a price, rather than a saving such as "$50 off"
+PRICE = re.compile(r'\$\s?\d[\d,]*(?:\.\d+)?(?![\d,.]|\s*(?:off|discount|less|back|in savings|savings|rebate)\b)', re.I)
+
+
+class PromptPacker:
+    """
+    Fits the descriptions of scraped deals into a budget of tokens for a model's prompt
+    Each deal's details and features are cut down to fit within deal_budget tokens, and the deals
+    most likely to be chosen - those that show a price and have the most to say - go in first,
+    until the prompt would come to more than budget tokens
+    """
+
+    BUDGET = 6000
+    DEAL_BUDGET = 300
+    SEPARATOR = "\n\n"
+
+    def __init__(self, model: str, budget: int = BUDGET, deal_budget: int = DEAL_BUDGET):
+        self.encoding = tiktoken.encoding_for_model(model)
+        self.budget = budget
+        self.deal_budget = deal_budget
+
+    def count(self, text: str) -> int:
+        """
+        Return the number of tokens in this text
+        """
+        return len(self.encoding.encode(text))
+
+    def trim(self, tokens: List[int], limit: int) -> str:
+        """
+        Return the text of at most limit of these tokens, marking where it has been cut short
+        """
+        if len(tokens) <= limit:
+            return self.encoding.decode(tokens)
+        return self.encoding.decode(tokens[:max(limit - 2, 0)]).rstrip("�").rstrip() + "…"
+
+    @staticmethod
+    def has_price(deal: ScrapedDeal) -> bool:
+        return any(PRICE.search(text) for text in (deal.title, deal.summary, deal.details))
+
+    def describe(self, deal: ScrapedDeal) -> tuple:
+        """
+        Return how highly this deal ranks for a place in the prompt, and its description within deal_budget tokens
+        The details get at least half of the room that the title and URL leave, and the features the rest
+        """
+        details = self.encoding.encode(deal.details.strip())
+        features = self.encoding.encode(deal.features.strip())
+        room = max(self.deal_budget - self.count(deal.describe("", "")), 0)
+        details_room = min(len(details), max(room - len(features), room // 2))
+        description = deal.describe(self.trim(details, details_room), self.trim(features, room - details_room))
+        rank = (self.has_price(deal), min(len(details) + len(features), room))
+        return rank, description
+
+    def pack(self, deals: List[ScrapedDeal], overhead: int = 0) -> List[str]:
+        """
+        Return descriptions of as many of these deals as fit in the budget, along with overhead tokens
+        for the rest of the prompt, best first; deals that don't fit are left out
+        """
+        described = sorted((self.describe(deal) for deal in deals), key=lambda pair: pair[0], reverse=True)
+        total = overhead
+        packed = []
+        for _, description in described:
+            tokens = self.count(description) + self.count(self.SEPARATOR)
+            if total + tokens <= self.budget:
+                packed.append(description)
+                total += tokens
+        return packed
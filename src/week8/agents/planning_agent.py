@@ -34,6 +34,18 @@ class PlanningAgent(Agent):
         self.log(f"Planning Agent has processed a deal with discount ${discount:.2f}")
         return Opportunity(deal=deal, estimate=estimate, discount=discount)
 
+    def run_batch(self, deals: List[Deal]) -> List[Opportunity]:
+        """
+        Run the workflow for several deals, pricing them all in one batch
+        :param deals: the deals, summarized from an RSS scrape
+        :returns: an opportunity for each deal, including the discount
+        """
+        self.log(f"Planning Agent is pricing up {len(deals)} potential deals")
+        estimates = self.ensemble.price_batch([deal.product_description for deal in deals])
+        opportunities = [Opportunity(deal=deal, estimate=estimate, discount=estimate - deal.price) for deal, estimate in zip(deals, estimates)]
+        self.log(f"Planning Agent has processed {len(deals)} deals")
+        return opportunities
+
     def plan(self, memory: List[str] = []) -> Optional[Opportunity]:
         """
         Run the full workflow:
@@ -46,7 +58,7 @@ class PlanningAgent(Agent):
         self.log("Planning Agent is kicking off a run")
         selection = self.scanner.scan(memory=memory)
         if selection:
-            opportunities = [self.run(deal) for deal in selection.deals[:5]]
+            opportunities = self.run_batch(selection.deals[:5])
             opportunities.sort(key=lambda opp: opp.discount, reverse=True)
             best = opportunities[0]
             self.log(f"Planning Agent has identified the best deal has discount ${best.discount:.2f}")
@@ -3,9 +3,10 @@
 import os
 import re
 from typing import List
-from sentence_transformers import SentenceTransformer
-import joblib
+import numpy as np
 from agents.agent import Agent
+from agents.embeddings import shared_embeddings
+from agents.forest import load_forest
 
 
 
@@ -17,11 +18,12 @@ class RandomForestAgent(Agent):
     def __init__(self):
         """
         Initialize this object by loading in the saved model weights
+        (memory-mapped, if they've been exported with agents.forest)
         and the SentenceTransformer vector encoding model
         """
         self.log("Random Forest Agent is initializing")
-        self.vectorizer = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-        self.model = joblib.load('random_forest_model.pkl')
+        self.vectorizer = shared_embeddings()
+        self.model = load_forest('random_forest_model.pkl', 'random_forest_model')
         self.log("Random Forest Agent is ready")
 
     def price(self, description: str) -> float:
@@ -34,4 +36,14 @@ class RandomForestAgent(Agent):
         vector = self.vectorizer.encode([description])
         result = max(0, self.model.predict(vector)[0])
         self.log(f"Random Forest Agent completed - predicting ${result:.2f}")
-        return result
\ No newline at end of file
+        return result
+
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Estimate the prices of several items, encoding them together and predicting over the whole matrix
+        """
+        self.log(f"Random Forest Agent is starting a prediction for {len(descriptions)} products")
+        vectors = self.vectorizer.encode(descriptions)
+        results = np.maximum(0, self.model.predict(vectors)).tolist()
+        self.log(f"Random Forest Agent completed - predicting {', '.join(f'${result:.2f}' for result in results)}")
+        return results
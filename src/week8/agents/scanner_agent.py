@@ -3,6 +3,7 @@ import json
 from typing import Optional, List
 from openai import OpenAI
 from agents.deals import ScrapedDeal, DealSelection
+from agents.packing import PromptPacker
 from agents.agent import Agent
 
 
@@ -10,6 +11,11 @@ class ScannerAgent(Agent):
 
     MODEL = "gpt-4o-mini"
 
+    # Limits on the tokens in the prompt, in the description of each deal, and in the response
+    PROMPT_BUDGET = PromptPacker.BUDGET
+    DEAL_BUDGET = PromptPacker.DEAL_BUDGET
+    MAX_RESPONSE_TOKENS = 1500
+
     SYSTEM_PROMPT = """You identify and summarize the 5 most detailed deals from a list, by selecting deals that have the most detailed, high quality description and the most clear price.
     Respond strictly in JSON with no explanation, using this format. You should provide the price as a number derived from the description. If the price of a deal isn't clear, do not include that deal in your response.
     Most important is that you respond with the 5 deals that have the most detailed product description with price. It's not important to mention the terms of the deal; most important is a thorough description of the product.
@@ -38,32 +44,40 @@ class ScannerAgent(Agent):
     name = "Scanner Agent"
     color = Agent.CYAN
 
-    def __init__(self):
+    def __init__(self, prompt_budget: int = PROMPT_BUDGET, deal_budget: int = DEAL_BUDGET):
         """
         Set up this instance by initializing OpenAI
+        :param prompt_budget: the most tokens the system and user prompts may come to
+        :param deal_budget: the most tokens to describe each deal with
         """
         self.log("Scanner Agent is initializing")
         self.openai = OpenAI()
+        self.packer = PromptPacker(self.MODEL, prompt_budget, deal_budget)
         self.log("Scanner Agent is ready")
 
     def fetch_deals(self, memory) -> List[ScrapedDeal]:
         """
         Look up deals published on RSS feeds
-        Return any new deals that are not already in the memory provided
+        Return any new deals that are not already in the memory provided,
+        only fetching the pages of the new ones
         """
         self.log("Scanner Agent is about to fetch deals from RSS feed")
-        urls = [opp.deal.url for opp in memory]
-        scraped = ScrapedDeal.fetch()
-        result = [scrape for scrape in scraped if scrape.url not in urls]
+        urls = {opp.deal.url for opp in memory}
+        result = ScrapedDeal.fetch(skip=urls)
         self.log(f"Scanner Agent received {len(result)} deals not already scraped")
         return result
 
     def make_user_prompt(self, scraped) -> str:
         """
-        Create a user prompt for OpenAI based on the scraped deals provided
+        Create a user prompt for OpenAI based on the scraped deals provided,
+        keeping the prompts within the token budget by shortening deals and leaving out the least promising
         """
+        overhead = sum(self.packer.count(text) for text in (self.SYSTEM_PROMPT, self.USER_PROMPT_PREFIX, self.USER_PROMPT_SUFFIX))
+        described = self.packer.pack(scraped, overhead)
+        if len(described) < len(scraped):
+            self.log(f"Scanner Agent left out {len(scraped) - len(described)} of {len(scraped)} deals to fit the prompt budget")
         user_prompt = self.USER_PROMPT_PREFIX
-        user_prompt += '\n\n'.join([scrape.describe() for scrape in scraped])
+        user_prompt += self.packer.SEPARATOR.join(described)
         user_prompt += self.USER_PROMPT_SUFFIX
         return user_prompt
 
@@ -84,7 +98,8 @@ class ScannerAgent(Agent):
                     {"role": "system", "content": self.SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
               ],
-                response_format=DealSelection
+                response_format=DealSelection,
+                max_tokens=self.MAX_RESPONSE_TOKENS
             )
             result = result.choices[0].message.parsed
             result.deals = [deal for deal in result.deals if deal.price>0]
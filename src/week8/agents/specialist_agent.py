@@ -1,3 +1,4 @@
+from typing import List
 import modal
 from agents.agent import Agent
 
@@ -27,3 +28,12 @@ class SpecialistAgent(Agent):
         result = self.pricer.price.remote(description)
         self.log(f"Specialist Agent completed - predicting ${result:.2f}")
         return result
+
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Estimate the prices of several items with one batched remote call, fanned out across the service
+        """
+        self.log(f"Specialist Agent is calling remote fine-tuned model for {len(descriptions)} products")
+        results = list(self.pricer.price.map(descriptions))
+        self.log(f"Specialist Agent completed - predicting {', '.join(f'${result:.2f}' for result in results)}")
+        return results
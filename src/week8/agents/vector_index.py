@@ -0,0 +1,162 @@
+"""
+An in-process alternative to querying the Chroma products collection
+
+Export the collection once:  python -m agents.vector_index products_vectorstore products_index [--ann]
+"""
+
+import os
+import sys
+import json
+import numpy as np
+
+
+class VectorIndex:
+    """
+    Finds the nearest neighbours of query vectors among the products in the Chroma datastore,
+    using the same squared L2 distance as the collection, without going through Chroma
+    The vectors are a contiguous matrix memory-mapped from disk, so they're loaded once and their
+    pages are shared between processes; queries are answered exactly, for a whole batch at once, by matrix product
+    With ann=True, a faiss HNSW index (if one was exported) answers them approximately instead, for large corpora
+    query() takes and returns the same shapes as Chroma's collection.query, so it can stand in for the collection
+    """
+
+    # Rows of the matrix to score at a time, bounding the memory a query uses
+    CHUNK = 65_536
+
+    def __init__(self, directory, vectors, norms, ids, documents, metadatas, ann=None):
+        self.directory = directory
+        self.vectors = vectors
+        self.norms = norms
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.ann = ann
+
+    @classmethod
+    def export(cls, collection, directory, dtype=np.float32, ann=False, page=10_000):
+        """
+        Write the contents of a Chroma collection to directory, in the form that open() reads
+        dtype float16 halves the size of the matrix on disk and in memory; scores are still computed in float32
+        """
+        os.makedirs(directory, exist_ok=True)
+        count = collection.count()
+        ids, documents, metadatas = [], [], []
+        vectors = None
+        for offset in range(0, count, page):
+            result = collection.get(include=['embeddings', 'documents', 'metadatas'], limit=page, offset=offset)
+            embeddings = np.asarray(result['embeddings'], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+", dtype=dtype, shape=(count, embeddings.shape[1]))
+            vectors[offset:offset + len(embeddings)] = embeddings
+            ids += result['ids']
+            documents += result['documents']
+            metadatas += result['metadatas']
+        vectors.flush()
+        np.save(os.path.join(directory, "norms.npy"), cls.norms_of(vectors))
+        with open(os.path.join(directory, "records.json"), "w") as file:
+            json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, file)
+        if ann:
+            cls.build_ann(vectors, os.path.join(directory, "hnsw.faiss"))
+        return cls.open(directory, ann=ann)
+
+    @classmethod
+    def norms_of(cls, vectors) -> np.ndarray:
+        """
+        Return the squared length of each row, computed a chunk at a time
+        """
+        return np.concatenate([
+            np.einsum('ij,ij->i', block, block)
+            for block in (np.asarray(vectors[start:start + cls.CHUNK], dtype=np.float32) for start in range(0, len(vectors), cls.CHUNK))
+        ])
+
+    @classmethod
+    def build_ann(cls, vectors, filename, neighbours=32):
+        """
+        Build and save a faiss HNSW index over these vectors, with the same squared L2 distance as Chroma
+        """
+        import faiss
+        index = faiss.IndexHNSWFlat(vectors.shape[1], neighbours, faiss.METRIC_L2)
+        for start in range(0, len(vectors), cls.CHUNK):
+            index.add(np.ascontiguousarray(vectors[start:start + cls.CHUNK], dtype=np.float32))
+        faiss.write_index(index, filename)
+
+    @classmethod
+    def open(cls, directory, ann=False) -> "VectorIndex":
+        """
+        Memory-map an index previously written with export
+        """
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        norms = np.load(os.path.join(directory, "norms.npy"))
+        with open(os.path.join(directory, "records.json")) as file:
+            records = json.load(file)
+        index = None
+        if ann:
+            import faiss
+            index = faiss.read_index(os.path.join(directory, "hnsw.faiss"))
+        return cls(directory, vectors, norms, records["ids"], records["documents"], records["metadatas"], index)
+
+    def search(self, queries, k=5):
+        """
+        Return the distances and row numbers of the k nearest vectors to each query, nearest first
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.vectors.shape[1])
+        k = min(k, len(self.vectors))
+        if self.ann is not None:
+            return self.ann.search(queries, k)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.vectors), self.CHUNK):
+            block = np.asarray(self.vectors[start:start + self.CHUNK], dtype=np.float32)
+            # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2, with ||q||^2 added once at the end
+            distances = np.concatenate([best_distances, self.norms[start:start + len(block)] - 2 * queries @ block.T], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+            keep = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            best_distances = np.take_along_axis(distances, keep, axis=1)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+        order = np.argsort(best_distances, axis=1, kind="stable")
+        distances = np.take_along_axis(best_distances, order, axis=1) + np.einsum('ij,ij->i', queries, queries)[:, None]
+        return np.maximum(distances, 0), np.take_along_axis(best_rows, order, axis=1)
+
+    def query(self, query_embeddings, n_results=5, **kwargs) -> dict:
+        """
+        Look up the n_results nearest products to each query, returning them as Chroma's collection.query does
+        """
+        distances, rows = self.search(query_embeddings, n_results)
+        return {
+            "ids": [[self.ids[row] for row in found] for found in rows],
+            "documents": [[self.documents[row] for row in found] for found in rows],
+            "metadatas": [[self.metadatas[row] for row in found] for found in rows],
+            "distances": distances.tolist(),
+        }
+
+    def agreement(self, collection, queries, n_results=5) -> float:
+        """
+        Return the fraction of these queries for which this index finds the same products as the collection, in the same order
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        ours = self.query(queries, n_results)["ids"]
+        theirs = collection.query(query_embeddings=queries.astype(float).tolist(), n_results=n_results)["ids"]
+        return sum(mine == chroma for mine, chroma in zip(ours, theirs)) / len(queries)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"<VectorIndex of {len(self):,} products{' with HNSW' if self.ann is not None else ''}>"
+
+
+def retriever_for(collection, directory="products_index", ann=False):
+    """
+    Return the VectorIndex exported to directory, if there is one, otherwise the collection itself
+    """
+    return VectorIndex.open(directory, ann=ann) if os.path.exists(os.path.join(directory, "records.json")) else collection
+
+
+if __name__=="__main__":
+    import chromadb
+    source, destination = sys.argv[1], sys.argv[2]
+    collection = chromadb.PersistentClient(path=source).get_or_create_collection('products')
+    index = VectorIndex.export(collection, destination, ann="--ann" in sys.argv)
+    sample = np.asarray(index.vectors[:min(len(index), 1000)], dtype=np.float32)
+    sample += np.random.default_rng(42).normal(0, 0.01, sample.shape).astype(np.float32)
+    print(f"Exported {index!r}, agreeing with Chroma's top 5 for {index.agreement(collection, sample) * 100:.1f}% of a sample of nudged copies of its vectors")
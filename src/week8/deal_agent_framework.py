@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 import chromadb
 from agents.planning_agent import PlanningAgent
 from agents.deals import Opportunity
+from agents.vector_index import retriever_for
 from sklearn.manifold import TSNE
 import numpy as np
 
@@ -37,6 +38,7 @@ def init_logging():
 class DealAgentFramework:
 
     DB = "products_vectorstore"
+    INDEX = "products_index"
     MEMORY_FILENAME = "memory.json"
 
     def __init__(self):
@@ -50,7 +52,7 @@ class DealAgentFramework:
     def init_agents_as_needed(self):
         if not self.planner:
             self.log("Initializing Agent Framework")
-            self.planner = PlanningAgent(self.collection)
+            self.planner = PlanningAgent(retriever_for(self.collection, self.INDEX))
             self.log("Agent Framework is ready")
         
     def read_memory(self) -> List[Opportunity]:
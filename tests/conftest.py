@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The course modules are flat scripts run from their week's folder; the modules both weeks share are identical
+for week in ("week6", "week8"):
+    sys.path.insert(0, os.path.join(ROOT, "src", week))
+
+
+@pytest.fixture
+def make_items():
+    """
+    Return a function that makes count Items with known prices, for predictors to be tested on
+    """
+    from items import Item
+
+    def make_items(count=10):
+        return [Item.restore(f"Product {i}", 10.0 + i, f"Prompt {i}\n\nPrice is $10.00", 20, "Appliances") for i in range(count)]
+    return make_items
@@ -0,0 +1,60 @@
+import threading
+from items import Item
+from comparison import Comparison, PreparedItem, shared
+from prediction_cache import PredictionCache
+
+calls = []
+lock = threading.Lock()
+
+
+def description(item):
+    with lock:
+        calls.append(item.title)
+    return item.title.lower()
+
+
+
+def test_shared_inputs_are_worked_out_once_per_item(make_items):
+    calls.clear()
+    shared_description = shared(description)
+    predictors = {
+        "Length": lambda item: len(shared_description(item)),
+        "Digits": lambda item: float(shared_description(item)[-1]),
+    }
+    results = Comparison(predictors, make_items(8), size=8, inputs=[description], samples=50).run()
+    assert sorted(calls) == sorted(f"Product {i}" for i in range(8))
+    assert [result["name"] for result in results] == ["Length", "Digits"]
+
+
+def test_shared_functions_still_work_on_plain_items(make_items):
+    calls.clear()
+    item = make_items(1)[0]
+    assert shared(description)(item) == shared(description)(item) == "product 0"
+    assert len(calls) == 2
+
+
+def test_items_without_a_category_can_be_prepared():
+    item = Item({"title": "Bare"}, 5.0, parse=False)
+    item.prompt = "Bare\n\nPrice is $5.00"
+    prepared = PreparedItem.of(item, {"upper": lambda item: item.title.upper()})
+    assert prepared.upper == "BARE"
+    assert prepared.test_prompt() == "Bare\n\nPrice is $"
+    assert getattr(prepared, "category", None) is None
+
+
+def test_warmup_is_honoured(make_items):
+    warmed = []
+    def predictor(item):
+        warmed.append(item.title)
+        return 1.0
+    Comparison([predictor], make_items(8), size=4, samples=10, warmup=2).run()
+    assert warmed == ["Product 4", "Product 5", "Product 0", "Product 1", "Product 2", "Product 3"]
+
+
+def test_testers_can_share_a_prediction_cache(tmp_path, make_items):
+    cache = PredictionCache(str(tmp_path / "predictions.db"))
+    predictors = {f"Constant {k}": (lambda k: lambda item: float(k))(k) for k in range(6)}
+    for _ in range(3):
+        results = Comparison(predictors, make_items(400), size=400, samples=10, cache=cache).run()
+    assert [result["average_error"] for result in results] == [sum(abs(10.0 + i - k) for i in range(400)) / 400 for k in range(6)]
+    assert cache.db.execute("SELECT entries FROM state").fetchone()[0] == 6 * 400
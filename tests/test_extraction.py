@@ -0,0 +1,46 @@
+import os
+import json
+import pytest
+from agents import extraction
+from agents.extraction import ENGINES, UnicodeDammit, outcome
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+PAGES, _ = extraction.corpus(os.path.join(DATA, "deals"))
+with open(os.path.join(DATA, "summaries.json"), encoding="utf-8") as file:
+    SUMMARIES = json.load(file)
+
+reference = ENGINES["html.parser"]
+engines = [engine for name, engine in ENGINES.items() if name != "html.parser"]
+
+
+@pytest.mark.parametrize("engine", engines, ids=lambda engine: engine.name)
+def test_pages_give_the_same_text_as_html_parser(engine):
+    for page in PAGES:
+        assert outcome(engine.content_section, page) == outcome(reference.content_section, page), page[:200]
+
+
+@pytest.mark.parametrize("engine", engines, ids=lambda engine: engine.name)
+def test_summaries_give_the_same_text_as_html_parser(engine):
+    for summary in SUMMARIES:
+        assert engine.summary(summary) == reference.summary(summary), summary[:200]
+
+
+def test_targeted_engine_cuts_out_most_pages_and_some_summaries():
+    targeted = ENGINES["targeted"]
+    pages = sum(targeted.fragment(UnicodeDammit(page, is_html=True).unicode_markup, "content-section") is not None for page in PAGES)
+    summaries = sum(targeted.fragment(summary, "snippet summary") is not None for summary in SUMMARIES)
+    assert pages >= len(PAGES) / 2
+    assert summaries > 0
+
+
+@pytest.mark.parametrize("page, text", [
+    ('<ul><li><div class="content-section">Details here</li><li>Features more</div></ul>', "Details here"),
+    ('<section><div class="content-section">A</section>B</div>', "A"),
+])
+def test_end_tags_of_ancestors_close_the_section(page, text):
+    assert ENGINES["targeted"].content_section(page) == reference.content_section(page) == text
+
+
+def test_unquoted_values_ending_in_a_slash_do_not_close_the_tag():
+    page = '<div class="content-section">A<div id=x/>B</div>C</div>'
+    assert ENGINES["targeted"].content_section(page) == reference.content_section(page) == "ABC"
@@ -0,0 +1,116 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from agents.fetcher import Fetcher
+from agents.http_cache import HttpCache
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves pages[path] with an ETag, answering 304 when the client already has it, and records each status
+    """
+
+    pages = {}
+    statuses = []
+
+    def do_GET(self):
+        content = self.pages.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            self.statuses.append(404)
+            return
+        etag = f'"{hash(content)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            self.statuses.append(304)
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        self.statuses.append(200)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.pages = {"/page": b"<p>first</p>"}
+    Handler.statuses = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return Fetcher(rate=1000, retries=0, cache=HttpCache(str(tmp_path / "http_cache.db")))
+
+
+def test_unchanged_pages_are_revalidated_with_their_etag(server, fetcher):
+    assert fetcher.get(f"{server}/page", ttl=0) == b"<p>first</p>"
+    assert fetcher.get(f"{server}/page", ttl=0) == b"<p>first</p>"
+    assert Handler.statuses == [200, 304]
+    Handler.pages["/page"] = b"<p>second</p>"
+    assert fetcher.get(f"{server}/page", ttl=0) == b"<p>second</p>"
+    assert Handler.statuses == [200, 304, 200]
+
+
+def test_responses_within_the_ttl_are_used_without_a_request(server, fetcher):
+    fetcher.cache.ttl = 0.2
+    fetcher.get(f"{server}/page")
+    fetcher.get(f"{server}/page")
+    assert Handler.statuses == [200]
+    time.sleep(0.3)
+    fetcher.get(f"{server}/page")
+    assert Handler.statuses == [200, 304]
+
+
+def test_parses_are_reused_until_the_page_or_the_parser_changes(server, fetcher):
+    calls = []
+    def parse(content):
+        calls.append(content)
+        return content.decode().upper()
+    url = f"{server}/page"
+    assert fetcher.parse(url, parse, ttl=0, parser="upper:1") == "<P>FIRST</P>"
+    assert fetcher.parse(url, parse, ttl=0, parser="upper:1") == "<P>FIRST</P>"
+    assert len(calls) == 1
+    assert fetcher.parse(url, parse, ttl=0, parser="upper:2") == "<P>FIRST</P>"
+    assert len(calls) == 2
+    Handler.pages["/page"] = b"<p>second</p>"
+    assert fetcher.parse(url, parse, ttl=0, parser="upper:2") == "<P>SECOND</P>"
+    assert Handler.statuses == [200, 304, 304, 200]
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.db"), max_bytes=250)
+    for name in "abc":
+        cache.put(name, b"x" * 100)
+        time.sleep(0.01)
+    assert cache.get("a") is None
+    assert cache.get("b").content == b"x" * 100
+    time.sleep(0.01)
+    cache.put("d", b"x" * 100)
+    assert cache.get("c") is None
+    assert cache.get("b") is not None and cache.get("d") is not None
+
+
+def test_responses_unused_for_max_age_are_dropped(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.db"), max_age=0.1)
+    cache.put("old", b"old")
+    time.sleep(0.2)
+    cache.put("new", b"new")
+    assert cache.get("old") is None
+    assert cache.get("new").content == b"new"
+
+
+def test_failed_requests_raise(server, fetcher):
+    with pytest.raises(Exception):
+        fetcher.get(f"{server}/missing")
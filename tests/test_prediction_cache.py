@@ -0,0 +1,63 @@
+import functools
+import pytest
+import testing
+from prediction_cache import PredictionCache, identity_for
+
+
+
+def price(item, dollars=1.0):
+    return dollars
+
+
+def test_lambdas_with_different_code_have_different_identities():
+    assert identity_for(lambda item: 1.0) != identity_for(lambda item: 100.0)
+    assert identity_for(lambda item: 1.0) == identity_for(lambda item: 1.0)
+
+
+def test_partials_and_instances_include_their_parameters():
+    assert identity_for(functools.partial(price, dollars=1.0)) != identity_for(functools.partial(price, dollars=2.0))
+
+    class Predictor:
+        def __init__(self, model):
+            self.model = model
+            self.client = object()
+
+        def __call__(self, item):
+            return 1.0
+
+    assert identity_for(Predictor("small")) != identity_for(Predictor("large"))
+    assert identity_for(Predictor("small")) == identity_for(Predictor("small"))
+
+
+def test_opaque_closures_need_a_version():
+    model = object()
+    with pytest.raises(ValueError):
+        identity_for(functools.partial(price, model))
+    assert identity_for(functools.partial(price, model), version=2).endswith(":2")
+
+
+def test_cached_guesses_are_not_shared_between_lambdas(tmp_path, make_items):
+    cache = PredictionCache(str(tmp_path / "predictions.db"))
+    data = make_items()
+    first = testing.Tester(lambda item: 1.0, data, size=10, cache=cache, headless=True, progress_every=None)
+    first.run()
+    second = testing.Tester(lambda item: 100.0, data, size=10, cache=cache, headless=True, progress_every=None)
+    second.run()
+    assert list(first.guesses) == [1.0] * 10
+    assert list(second.guesses) == [100.0] * 10
+    again = testing.Tester(lambda item: 100.0, data, size=10, cache=cache, headless=True, progress_every=None)
+    again.run()
+    assert list(again.outcomes) == ["cached"] * 10
+
+
+def test_entries_are_counted_as_they_are_added_and_evicted(tmp_path, make_items):
+    cache = PredictionCache(str(tmp_path / "predictions.db"), max_entries=15)
+    data = make_items(20)
+    cache.put("first", data[:10], [1.0] * 10)
+    cache.put("first", data[:10], [2.0] * 10)
+    cache.put("second", data[:10], [3.0] * 10)
+    count = cache.db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    assert count == cache.db.execute("SELECT entries FROM state").fetchone()[0] == 15
+    assert cache.get("second", data[:10]) == [3.0] * 10
+    cache.invalidate("second")
+    assert cache.db.execute("SELECT entries FROM state").fetchone()[0] == 5
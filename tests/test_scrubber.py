@@ -0,0 +1,83 @@
+import os
+import re
+import json
+import pytest
+from items import Item, Scrubber, MIN_CHARS, CEILING_CHARS
+
+# Synthetic datapoints, not rows from the raw_meta_* datasets: written in the shape of Amazon metadata, they pile on
+# the cases the batched scrub has to fall back on, such as non-ASCII digits and NUL characters, among plainer ones
+DATAPOINTS = os.path.join(os.path.dirname(__file__), "data", "synthetic_datapoints.json")
+
+
+def original_scrub_details(details):
+    for remove in Item.REMOVALS:
+        details = details.replace(remove, "")
+    return details
+
+
+def original_scrub(stuff):
+    stuff = re.sub(r'[:\[\]"{}【】\s]+', ' ', stuff).strip()
+    stuff = stuff.replace(" ,", ",").replace(",,,",",").replace(",,",",")
+    words = stuff.split(' ')
+    select = [word for word in words if len(word)<7 or not any(char.isdigit() for char in word)]
+    return " ".join(select)
+
+
+def original_text(data):
+    contents = '\n'.join(data['description'])
+    if contents:
+        contents += '\n'
+    features = '\n'.join(data['features'])
+    if features:
+        contents += features + '\n'
+    if data['details']:
+        contents += original_scrub_details(data['details']) + '\n'
+    if len(contents) > MIN_CHARS:
+        contents = contents[:CEILING_CHARS]
+        return f"{original_scrub(data['title'])}\n{original_scrub(contents)}"
+    return None
+
+
+@pytest.fixture(scope="module")
+def datapoints():
+    with open(DATAPOINTS, encoding="utf-8") as file:
+        return json.load(file)
+
+
+@pytest.fixture(scope="module")
+def texts(datapoints):
+    texts = []
+    for data in datapoints:
+        texts += [data['title'], data['details'], *data['description'], *data['features']]
+    return texts
+
+
+def test_synthetic_sample_covers_the_fallbacks(texts):
+    assert any(Scrubber.SEPARATOR in text for text in texts)
+    assert any(not text.isascii() and any(char.isdigit() and char not in "0123456789" for char in text) for text in texts)
+
+
+def test_scrub_matches_original(texts):
+    assert Item.scrubber.scrub(texts) == [original_scrub(text) for text in texts]
+
+
+def test_scrub_matches_original_without_separator(texts):
+    texts = [text for text in texts if Scrubber.SEPARATOR not in text]
+    assert Item.scrubber.scrub(texts) == [original_scrub(text) for text in texts]
+
+
+def test_remove_matches_original(texts):
+    assert Item.scrubber.remove(texts) == [original_scrub_details(text) for text in texts]
+    ascii_texts = [text for text in texts if Scrubber.SEPARATOR not in text]
+    assert Item.scrubber.remove(ascii_texts) == [original_scrub_details(text) for text in ascii_texts]
+
+
+def test_single_strings_match_original(texts):
+    for text in texts:
+        assert Item.scrubber.scrub([text]) == [original_scrub(text)]
+        assert Item.scrubber.remove([text]) == [original_scrub_details(text)]
+
+
+def test_prepare_batch_matches_original(datapoints):
+    items = [Item(data, 10.0, parse=False) for data in datapoints]
+    assert Item.prepare_batch(items, datapoints) == [original_text(data) for data in datapoints]
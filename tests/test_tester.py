@@ -0,0 +1,40 @@
+import time
+import pytest
+import testing
+
+
+
+def broken(item):
+    raise TypeError("not a predictor")
+
+
+@pytest.fixture
+def run(make_items):
+    def run(predictor, **options):
+        tester = testing.Tester(predictor, make_items(), size=10, headless=True, progress_every=None, **options)
+        tester.run()
+        return tester
+    return run
+
+
+def test_errors_are_raised_by_default(run):
+    with pytest.raises(TypeError):
+        run(broken)
+
+
+def test_errors_score_zero_when_asked(run, capsys):
+    tester = run(broken, on_error="zero")
+    assert list(tester.guesses) == [0.0] * 10
+    assert tester.timings()["errors"] == 10
+    assert "Errors=10 Timeouts=0" in capsys.readouterr().out
+
+
+def test_timeouts_score_zero_once_a_timeout_is_set(run, capsys):
+    tester = run(lambda item: time.sleep(1) or 1.0, timeout=0.01)
+    assert tester.timings()["timeouts"] == 10
+    assert "Errors=0 Timeouts=10" in capsys.readouterr().out
+
+
+def test_successful_runs_report_errors_too(run, capsys):
+    run(lambda item: item.price)
+    assert "Errors=0 Timeouts=0" in capsys.readouterr().out